@@ -0,0 +1,65 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+
+# Permet d'importer les modules de l'application
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.security import get_password_hash
+from app.core.passwords import PasswordHasher
+
+# Débit de vérification bcrypt (≈ logins/s) selon le coût et le nombre de threads du pool.
+# Usage : python app/benchmark_login.py --rounds 10 11 12 --workers 1 2 4 --logins 200
+# Le débit de bout en bout (HTTP + base) se mesure avec app/benchmark_api.py --endpoints login
+
+
+async def run(rounds: int, workers: int, logins: int) -> dict:
+    password = "benchmark-password"
+    hashed = get_password_hash(password, rounds=rounds)
+    # TTL négatif : cache des vérifications désactivé, chaque login paie bcrypt
+    hasher = PasswordHasher(workers=workers, max_queue=logins, cache_ttl=-1)
+
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(hasher.verify(password, hashed) for _ in range(logins)))
+    duration = time.perf_counter() - start_time
+    assert all(results)
+
+    throughput = logins / duration
+    # bcrypt libère le GIL : le débit monte avec les threads jusqu'au nombre de cœurs
+    cores = min(workers, os.cpu_count() or 1)
+    return {
+        "rounds": rounds,
+        "workers": workers,
+        "logins": logins,
+        "duration_seconds": round(duration, 3),
+        "logins_per_second": round(throughput, 1),
+        "logins_per_second_per_core": round(throughput / cores, 1),
+        "ms_per_verification": round(cores / throughput * 1000, 2),
+    }
+
+
+async def main(args):
+    results = []
+    print(f"{'rounds':>7}{'workers':>9}{'logins/s':>10}{'/core':>9}{'ms/verif':>10}")
+    for rounds in args.rounds:
+        for workers in args.workers:
+            r = await run(rounds, workers, args.logins)
+            results.append(r)
+            print(f"{rounds:>7}{workers:>9}{r['logins_per_second']:>10.1f}"
+                  f"{r['logins_per_second_per_core']:>9.1f}{r['ms_per_verification']:>10.2f}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+    print(f"\n✅ Résultats enregistrés dans {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du débit de login (bcrypt) par cœur")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--output", default="bench_login.json")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+import os
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+)
+
+# --- CONFIGURATION ---
+# Avec gunicorn (plusieurs workers), définir PROMETHEUS_MULTIPROC_DIR : chaque worker écrit
+# ses métriques dans ce dossier et /metrics agrège tous les processus.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Bornes en secondes : de la recherche BM25 (ms) à la génération LLM (dizaines de s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Durée de chaque étape d'une requête (embed, retrieve, generate, user_lookup, persist...)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Durée des requêtes HTTP par route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+HISTORY_ROWS_DROPPED = Counter(
+    "rag_history_rows_dropped_total",
+    "Lignes d'historique abandonnées (overflow : tampon plein, rejected : refusées par la base)",
+    ["reason"],
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_DURATION.labels(stage=stage).observe(seconds)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    REQUEST_DURATION.labels(method=method, route=route, status=str(status)).observe(seconds)
+
+
+def observe_history_drop(reason: str, count: int = 1):
+    HISTORY_ROWS_DROPPED.labels(reason=reason).inc(count)
+
+
+def render_metrics():
+    """Retourne (contenu, content-type) au format texte Prometheus."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,111 @@
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.core.security import verify_password, get_password_hash
+
+# --- CONFIGURATION ---
+# Threads dédiés à bcrypt (qui libère le GIL) : les logins ne prennent plus
+# les threads du pool par défaut utilisés par /query (recherche Chroma, BM25...)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Hachages en attente au-delà des workers ; au-delà, la requête est refusée (503)
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+# Cache des vérifications réussies (un utilisateur qui se reconnecte ne repasse pas par bcrypt)
+CREDENTIAL_CACHE_TTL = float(os.getenv("CREDENTIAL_CACHE_TTL", "600"))  # secondes
+CREDENTIAL_CACHE_MAX_ENTRIES = int(os.getenv("CREDENTIAL_CACHE_MAX_ENTRIES", "10000"))
+
+
+class PasswordHasherBusy(Exception):
+    """Trop de hachages en cours ou en attente : le client doit réessayer plus tard."""
+
+
+class PasswordHasher:
+    """
+    Exécute bcrypt sur un pool borné avec contrôle d'admission, et mémorise les
+    vérifications réussies. La clé du cache est un HMAC (clé aléatoire propre au processus)
+    du hash stocké et du mot de passe : rien n'est réutilisable hors du processus,
+    et un changement de mot de passe (nouveau hash) invalide l'entrée.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE,
+                 cache_ttl: float = CREDENTIAL_CACHE_TTL, cache_max_entries: int = CREDENTIAL_CACHE_MAX_ENTRIES):
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._cache_key = secrets.token_bytes(32)
+        self._verified = OrderedDict()
+
+        self.rejected = 0
+        self.cache_hits = 0
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        if plain_password is None or hashed_password is None:
+            return False
+        key = self._credential_key(plain_password, hashed_password)
+        if self._is_verified(key):
+            self.cache_hits += 1
+            return True
+        valid = await self._run(verify_password, plain_password, hashed_password)
+        if valid:
+            self._remember(key)
+        return valid
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "cache_hits": self.cache_hits,
+            "cached_credentials": len(self._verified),
+        }
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _credential_key(self, plain_password: str, hashed_password: str) -> bytes:
+        message = hashed_password.encode("utf-8") + b"\0" + plain_password.encode("utf-8")
+        return hmac.new(self._cache_key, message, hashlib.sha256).digest()
+
+    def _is_verified(self, key: bytes) -> bool:
+        with self._lock:
+            expire_at = self._verified.get(key)
+            if expire_at is None:
+                return False
+            if time.time() > expire_at:
+                del self._verified[key]
+                return False
+            self._verified.move_to_end(key)
+            return True
+
+    def _remember(self, key: bytes):
+        with self._lock:
+            self._verified[key] = time.time() + self.cache_ttl
+            self._verified.move_to_end(key)
+            while len(self._verified) > self.cache_max_entries:
+                self._verified.popitem(last=False)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,81 @@
+import os
+import time
+import resource
+import threading
+
+# Instant d'import du module (≈ démarrage du processus worker)
+PROCESS_START = time.time()
+
+
+def get_rss_mb() -> float:
+    """RSS courant du processus en Mo (/proc sous Linux, pic RSS sinon)."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class ResourceRegistry:
+    """
+    Registre des ressources lourdes (modèles, clients, bases) chargées au premier usage.
+    Chaque ressource est construite une seule fois par processus ; le temps de chargement
+    et la RSS consommée sont mesurés pour la sonde de readiness.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._metrics = {}
+
+    def register(self, name: str, factory):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            if name not in self._instances:
+                rss_before = get_rss_mb()
+                start_time = time.time()
+                print(f"Chargement de la ressource '{name}'...")
+                self._instances[name] = self._factories[name]()
+                self._metrics[name] = {
+                    "load_seconds": round(time.time() - start_time, 3),
+                    "rss_delta_mb": round(get_rss_mb() - rss_before, 1),
+                    "loaded_at": time.time(),
+                    "pid": os.getpid(),
+                }
+            return self._instances[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def is_ready(self, names=None) -> bool:
+        return all(self.is_loaded(name) for name in (names or self._factories))
+
+    def preload(self, names=None):
+        """Charge immédiatement les ressources (warmup, ou avant fork des workers)."""
+        for name in names or self._factories:
+            self.get(name)
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "rss_mb": get_rss_mb(),
+            "uptime_seconds": round(time.time() - PROCESS_START, 1),
+            "resources": {
+                name: {"loaded": self.is_loaded(name), **self._metrics.get(name, {})}
+                for name in self._factories
+            },
+        }
+
+
+registry = ResourceRegistry()
@@ -1,4 +1,8 @@
 import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,6 +10,10 @@ from dotenv import load_dotenv
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import bcrypt  # On utilise bcrypt directement (plus de passlib !)
+from sqlalchemy import select
+from app.database.database import AsyncSessionLocal
+from app.models.users import User
+from app.core.timing import timed
 
 load_dotenv()
 
@@ -13,6 +21,11 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Coût bcrypt (2^rounds itérations) : +1 double le temps de hachage et de vérification
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Cache des tokens déjà validés : ni décodage JWT ni requête SQL pour un token connu
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))  # secondes
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
 
 # Sécurité HTTP
 security = HTTPBearer()
@@ -33,15 +46,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     
     return bcrypt.checkpw(pwd_bytes, hash_bytes)
 
-def get_password_hash(password: str) -> str:
-    """Hache un mot de passe."""
+def get_password_hash(password: str, rounds: int = None) -> str:
+    """Hache un mot de passe (coût BCRYPT_ROUNDS par défaut)."""
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(pwd_bytes, salt)
     
     # On retourne une string pour le stockage en BDD
     return hashed.decode('utf-8')
 
+def needs_rehash(hashed_password: str) -> bool:
+    """Vrai si le hash a été calculé avec un autre coût que BCRYPT_ROUNDS ("$2b$12$...")."""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 # --- 2. FONCTIONS JWT ---
 # (Cette partie reste identique)
 def create_access_token(data: dict):
@@ -58,13 +78,71 @@ def decode_access_token(token: str) -> Optional[dict]:
     except JWTError:
         return None
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+# --- 3. UTILISATEUR COURANT ---
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    username: str
+
+
+class PrincipalCache:
+    """Token -> Principal, avec TTL (borné par l'expiration du token) et éviction LRU."""
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expire_at, principal = entry
+            if time.time() > expire_at:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: float = None):
+        expire_at = time.time() + self.ttl
+        if token_exp is not None:
+            expire_at = min(expire_at, token_exp)
+        with self._lock:
+            self._entries[token] = (expire_at, principal)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+principal_cache = PrincipalCache()
+
+async def resolve_principal(payload: dict) -> Optional[Principal]:
+    """L'id vient du claim "uid" ; seuls les tokens émis avant son ajout passent par la base."""
+    if payload.get("uid") is not None:
+        return Principal(id=int(payload["uid"]), username=payload.get("sub"))
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id).where(User.username == payload.get("sub")))
+        user_id = result.scalar_one_or_none()
+    return Principal(id=user_id, username=payload.get("sub")) if user_id is not None else None
+
+async def current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    """Dépendance partagée par les routes authentifiées : l'utilisateur du token."""
     token = credentials.credentials
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token invalide ou expiré",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return payload
\ No newline at end of file
+    with timed("user_lookup"):
+        principal = principal_cache.get(token)
+        if principal is not None:
+            return principal
+
+        payload = decode_access_token(token)
+        principal = await resolve_principal(payload) if payload is not None else None
+        if principal is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token invalide ou expiré",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal_cache.put(token, principal, token_exp=payload.get("exp"))
+        return principal
\ No newline at end of file
@@ -0,0 +1,83 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.core.metrics import observe_stage, observe_request
+
+# Durées par étape (embed, retrieve, generate, persist...) de la requête HTTP en cours
+_stage_timings = ContextVar("stage_timings", default=None)
+
+
+def start_timings() -> dict:
+    """Ouvre un relevé des étapes pour le contexte courant (une requête)."""
+    timings = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+def current_timings() -> dict:
+    """Durées déjà relevées pour la requête en cours ({} hors requête)."""
+    return _stage_timings.get() or {}
+
+
+def record_stage(stage: str, seconds: float):
+    """
+    Span d'une étape : observé dans l'histogramme Prometheus et ajouté
+    au relevé de la requête en cours (s'il y en a une).
+    """
+    observe_stage(stage, seconds)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start_time)
+
+
+def server_timing_header(timings: dict, total_seconds: float = None) -> str:
+    """En-tête Server-Timing : "embed;dur=12.3, retrieve;dur=4.1, ..." (durées en ms)."""
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    if total_seconds is not None:
+        entries.append(f"total;dur={total_seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI : chaque requête HTTP reçoit son relevé d'étapes, renvoyé dans
+    l'en-tête Server-Timing (lu par les navigateurs et par app/benchmark_api.py).
+    Pour une réponse en streaming, seules les étapes terminées avant le premier octet y figurent.
+    La durée totale est aussi observée dans l'histogramme Prometheus par route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_timings()
+        start_time = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start_time)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Modèle de route ("/history") et non le chemin brut : cardinalité bornée
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe_request(scope["method"], route, status, time.perf_counter() - start_time)
@@ -0,0 +1,188 @@
+import os
+import asyncio
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError, InterfaceError, TimeoutError as PoolTimeoutError
+from app.core.metrics import observe_history_drop
+from app.database.database import AsyncSessionLocal
+from app.models.history import AnswersHistory
+
+# --- CONFIGURATION ---
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))  # secondes
+HISTORY_FLUSH_SIZE = int(os.getenv("HISTORY_FLUSH_SIZE", "200"))  # lignes déclenchant un flush immédiat
+# Au-delà (base lente ou indisponible), les lignes les plus anciennes sont abandonnées : la mémoire reste bornée
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+# Une ligne rejetée par la base (contrainte, donnée invalide) est abandonnée après ce nombre d'essais
+HISTORY_MAX_ATTEMPTS = int(os.getenv("HISTORY_MAX_ATTEMPTS", "3"))
+
+# Base injoignable : toutes les lignes sont gardées pour le flush suivant, sans compter d'essai
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError)
+
+
+class HistoryWriter:
+    """
+    Écriture différée de l'historique : les routes ajoutent des lignes dans un tampon,
+    une tâche de fond les insère en un seul INSERT multi-lignes (toutes les
+    HISTORY_FLUSH_INTERVAL secondes ou dès HISTORY_FLUSH_SIZE lignes).
+    Le commit n'est plus sur le chemin de la requête ; stop() vide le tampon à l'arrêt.
+    Les erreurs d'écriture ne remontent jamais à la requête : base injoignable -> nouvel essai,
+    INSERT rejeté -> lignes réessayées une par une, une ligne rejetée HISTORY_MAX_ATTEMPTS fois
+    est abandonnée (loguée et comptée dans rag_history_rows_dropped_total).
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, flush_interval: float = HISTORY_FLUSH_INTERVAL,
+                 flush_size: int = HISTORY_FLUSH_SIZE, max_pending: int = HISTORY_MAX_PENDING,
+                 max_attempts: int = HISTORY_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+
+        self._rows = []  # (ligne, nombre d'essais rejetés)
+        self._flush_lock = None
+        self._wakeup = None
+        self._task = None
+
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = {"overflow": 0, "rejected": 0}
+
+    def start(self):
+        """Démarre la tâche de flush (dans la boucle d'événements courante)."""
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Arrête la tâche de fond et écrit les lignes restantes."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def add(self, **row):
+        """Met une ligne de AnswersHistory en attente (horodatée maintenant, pas au flush). Ne lève jamais."""
+        await self.add_many([row])
+
+    async def add_many(self, rows: list):
+        """Met plusieurs lignes en attente : un seul flush (ou un seul réveil du flusher) pour tout le lot."""
+        if not rows:
+            return
+        now = datetime.utcnow()
+        for row in rows:
+            row.setdefault("timestamp", now)
+            self._rows.append((row, 0))
+        self._drop_overflow()
+        if self._task is None:
+            # Pas de tâche de fond (scripts, tests) : écriture immédiate, un INSERT multi-lignes
+            await self.flush()
+        elif len(self._rows) >= self.flush_size:
+            self._wakeup.set()
+
+    def has_pending(self, user_id: int) -> bool:
+        return any(row.get("user_id") == user_id for row, _ in self._rows)
+
+    async def flush(self):
+        """
+        Insère toutes les lignes en attente (un INSERT multi-lignes, un commit).
+        Ne lève pas (sauf annulation) : les lignes non écrites restent en attente ou sont abandonnées.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            entries, self._rows = self._rows, []
+            if not entries:
+                return
+            try:
+                await self._insert([row for row, _ in entries])
+            except asyncio.CancelledError:
+                # Arrêt en cours de flush : les lignes sont remises en tête du tampon
+                self._requeue(entries)
+                raise
+            except TRANSIENT_ERRORS as e:
+                self.failures += 1
+                self._requeue(entries)
+                print(f"⚠️ Base injoignable, historique en attente ({len(self._rows)} lignes) : {e}")
+                return
+            except Exception as e:
+                # INSERT rejeté : on isole les lignes fautives en les réessayant une par une
+                self.failures += 1
+                print(f"⚠️ INSERT de l'historique rejeté ({len(entries)} lignes), essai ligne par ligne : {e}")
+                entries = await self._insert_one_by_one(entries)
+                if entries is None:
+                    return
+            self.flushes += 1
+            self.flushed_rows += len(entries)
+
+    async def _insert(self, rows: list):
+        async with self.session_factory() as session:
+            await session.execute(insert(AnswersHistory), rows)
+            await session.commit()
+
+    async def _insert_one_by_one(self, entries: list):
+        """Retourne les entrées écrites, ou None si la base est devenue injoignable."""
+        written, rejected = [], []
+        for index, (row, attempts) in enumerate(entries):
+            try:
+                await self._insert([row])
+                written.append((row, attempts))
+            except TRANSIENT_ERRORS:
+                self._requeue(rejected + entries[index:])
+                return None
+            except Exception as e:
+                if attempts + 1 >= self.max_attempts:
+                    self._drop("rejected", 1)
+                    print(f"❌ Ligne d'historique abandonnée après {attempts + 1} essais "
+                          f"(user_id={row.get('user_id')}, question={str(row.get('question'))[:80]!r}) : {e}")
+                else:
+                    rejected.append((row, attempts + 1))
+        self._requeue(rejected)
+        return written
+
+    def _requeue(self, entries: list):
+        """Remet des entrées en tête du tampon (elles sont plus anciennes que les suivantes)."""
+        self._rows = entries + self._rows
+        self._drop_overflow()
+
+    def _drop_overflow(self):
+        # Tampon plein (base lente ou indisponible) : les lignes les plus anciennes sont abandonnées
+        overflow = len(self._rows) - self.max_pending
+        if overflow > 0:
+            del self._rows[:overflow]
+            self._drop("overflow", overflow)
+            print(f"⚠️ Tampon d'historique plein : {overflow} ligne(s) les plus anciennes abandonnée(s)")
+
+    def _drop(self, reason: str, count: int):
+        self.dropped[reason] += count
+        observe_history_drop(reason, count)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._rows),
+            "flushed_rows": self.flushed_rows,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": dict(self.dropped),
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            failures = self.failures
+            await self.flush()
+            if self.failures > failures:
+                # Déjà logué ; on attend un intervalle avant de réessayer
+                await asyncio.sleep(self.flush_interval)
+
+
+history_writer = HistoryWriter()
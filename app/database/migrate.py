@@ -0,0 +1,29 @@
+import sys
+import os
+
+# Ajout du dossier parent au path pour pouvoir importer 'app'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database.database import engine, sync_schema
+# Les modèles doivent être importés pour être enregistrés dans Base.metadata
+from app.models.users import User
+from app.models.history import AnswersHistory
+
+
+def migrate():
+    """
+    Met le schéma à jour (tables, colonnes et index manquants), une fois par déploiement :
+    python app/database/migrate.py, ou automatiquement dans le maître gunicorn (gunicorn.conf.py).
+    """
+    sync_schema()
+    # Aucune connexion ouverte ici ne doit être héritée par les workers forkés
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    try:
+        migrate()
+        print("✅ Schéma de la base à jour")
+    except Exception as e:
+        print(f"❌ Erreur de migration : {e}")
+        sys.exit(1)
@@ -1,18 +1,56 @@
-from fastapi import FastAPI, HTTPException
-from app.rag.chain import query_rag
-from app.database.database import Base, engine
-from app.schemas.schemas import QueryRequest, QueryResponse
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from app.core.resources import registry
+from app.core.timing import ServerTimingMiddleware
+from app.core.metrics import render_metrics
+from app.core.passwords import password_hasher
+from app.rag.chain import semantic_cache, response_cache, reranker, SERVING_RESOURCES, PRELOAD_RESOURCES
+from app.database.database import async_engine
+from app.database.history_writer import history_writer
+from app.ml.centroids import centroid_assigner
 from app.routes.query import router as query_router
 from app.routes.auth import router as auth_router
 
 
-Base.metadata.create_all(bind=engine)
+# RAG_PRELOAD=1 (avec gunicorn --preload) : les poids du modèle sont chargés dans le
+# processus maître avant le fork et partagés en copy-on-write par tous les workers.
+if os.getenv("RAG_PRELOAD", "0") == "1":
+    registry.preload(PRELOAD_RESOURCES)
+
+# RAG_WARMUP=1 : chaque worker charge ses ressources en arrière-plan dès le démarrage,
+# sans bloquer l'ouverture du port (la readiness passe à 200 une fois prêt).
+RAG_WARMUP = os.getenv("RAG_WARMUP", "1") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = None
+    if RAG_WARMUP:
+        warmup = asyncio.get_running_loop().run_in_executor(None, registry.preload, SERVING_RESOURCES)
+    history_writer.start()
+    # Centres des clusters en mémoire (chargés puis rechargés en arrière-plan) : cluster de chaque question
+    centroid_assigner.start()
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await centroid_assigner.stop()
+    # Les réponses encore en tampon sont écrites avant la fermeture du pool
+    await history_writer.stop()
+    # Fermeture propre du pool asyncpg
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="Support IT Assistant RAG",
     description="API pour interroger le manuel de support IT via une IA.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+# Durées par étape (embed, retrieve, generate, persist...) dans l'en-tête Server-Timing
+app.add_middleware(ServerTimingMiddleware)
 app.include_router(query_router, tags=["RAG Query"])
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 
@@ -21,5 +59,27 @@ app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 def read_root():
     return {"status": "ok", "message": "L'API Support IT est en ligne !"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Compteurs hit/miss des caches de réponses (et activité du re-ranking, du pool bcrypt, de l'historique et des clusters)."""
+    return {"semantic": semantic_cache.stats(), "exact": response_cache.stats(), "rerank": reranker.stats(),
+            "passwords": password_hasher.stats(), "history_writer": history_writer.stats(),
+            "clusters": centroid_assigner.stats()}
+
+@app.get("/metrics")
+def metrics():
+    """Histogrammes Prometheus : durée par étape du pipeline et par route HTTP."""
+    content, content_type = render_metrics()
+    return Response(content, media_type=content_type)
 
+@app.get("/health/live")
+def liveness():
+    return {"status": "ok"}
 
+@app.get("/health/ready")
+def readiness():
+    """Prêt quand le modèle d'embedding, Chroma et la chaîne LLM sont chargés dans ce worker."""
+    status = registry.status()
+    ready = registry.is_ready(SERVING_RESOURCES)
+    status["status"] = "ready" if ready else "loading"
+    return JSONResponse(status, status_code=200 if ready else 503)
@@ -0,0 +1,93 @@
+import os
+import asyncio
+import numpy as np
+from app.ml.clustering import CLUSTER_MODEL_PATH, load_cluster_model
+
+# --- CONFIGURATION ---
+# Fréquence (secondes) à laquelle on vérifie si clustering.py a réécrit le modèle
+CLUSTER_RELOAD_INTERVAL = float(os.getenv("CLUSTER_RELOAD_INTERVAL", "30"))
+
+
+class CentroidAssigner:
+    """
+    Attribution du cluster au moment de la question : centres du MiniBatchKMeans persisté
+    gardés en mémoire, cluster = centre le plus proche (distance euclidienne, comme predict).
+    argmin ||x - c||² = argmax (x·c - ||c||²/2) : un produit matrice-vecteur sur k centres.
+    Le rechargement (quand clustering.py réécrit le modèle) se fait dans une tâche de fond,
+    via l'executor : les requêtes ne lisent jamais le fichier et ne prennent aucun verrou.
+    """
+
+    def __init__(self, path: str = CLUSTER_MODEL_PATH, reload_interval: float = CLUSTER_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._state = None  # (centres, ||c||²/2), remplacé d'un bloc : lecture atomique
+        self._mtime = None
+        self._task = None
+        self.assigned = 0
+        self.unassigned = 0
+
+    def load(self):
+        """(Re)charge les centres si le fichier a changé ; sans modèle, aucune attribution. Bloquant."""
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime == self._mtime:
+            return
+        kmeans = load_cluster_model(self.path) if mtime is not None else None
+        if kmeans is None:
+            self._state = None
+        else:
+            centers = np.asarray(kmeans.cluster_centers_, dtype=np.float32)
+            self._state = (centers, 0.5 * np.einsum("ij,ij->i", centers, centers))
+        self._mtime = mtime
+
+    def start(self):
+        """Démarre la tâche de rechargement (dans la boucle d'événements courante)."""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.load)
+            except Exception as e:
+                print(f"⚠️ Rechargement des centres de clusters impossible : {e}")
+            await asyncio.sleep(self.reload_interval)
+
+    def assign_many(self, vectors) -> list:
+        """Cluster de chaque vecteur (None si pas de vecteur ou pas encore de modèle)."""
+        state = self._state
+        labels = [None] * len(vectors)
+        present = [i for i, vector in enumerate(vectors) if vector is not None]
+        if state is None or not present:
+            self.unassigned += len(vectors)
+            return labels
+        centers, half_norms = state
+        matrix = np.asarray([vectors[i] for i in present], dtype=np.float32)
+        for i, label in zip(present, np.argmax(matrix @ centers.T - half_norms, axis=1)):
+            labels[i] = int(label)
+        self.assigned += len(present)
+        self.unassigned += len(vectors) - len(present)
+        return labels
+
+    def assign(self, vector):
+        return self.assign_many([vector])[0]
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            "loaded": state is not None,
+            "num_clusters": 0 if state is None else len(state[0]),
+            "assigned": self.assigned,
+            "unassigned": self.unassigned,
+        }
+
+
+centroid_assigner = CentroidAssigner()
@@ -1,65 +1,155 @@
 import sys
 import os
+import time
+import argparse
 
 # Ajout du dossier parent au path pour pouvoir importer 'app'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from sqlalchemy.orm import Session
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
+import joblib
+import numpy as np
+from sqlalchemy import select, update
+from sklearn.cluster import MiniBatchKMeans
 from app.database.database import SessionLocal
 from app.models.history import AnswersHistory
 # --- CORRECTION ICI ---
 # L'import de User est indispensable pour que SQLAlchemy résolve la clé étrangère "users.id"
-from app.models.users import User 
+from app.models.users import User
+from app.rag.embedding_cache import get_cached_embeddings, unpack_embeddings
 
 # Configuration
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 NUM_CLUSTERS = 5
+# Modèle MiniBatchKMeans persisté entre deux exécutions (mis à jour par partial_fit)
+CLUSTER_MODEL_PATH = os.getenv("CLUSTER_MODEL_PATH", "./models/question_clusters.joblib")
+# Questions lues, encodées et mises à jour par lot (mémoire bornée)
+CLUSTER_BATCH_SIZE = int(os.getenv("CLUSTER_BATCH_SIZE", "10000"))
 
-def process_clustering():
-    print("--- Démarrage du clustering des questions ---")
+
+def load_cluster_state(path: str = CLUSTER_MODEL_PATH):
+    """État persisté {kmeans, embedding_model, updated_at}, ou None s'il n'existe pas (ou autre modèle d'embedding)."""
+    if not os.path.exists(path):
+        return None
+    state = joblib.load(path)
+    if state.get("embedding_model") != MODEL_NAME:
+        print(f"⚠️ Modèle de clusters ignoré : calculé avec {state.get('embedding_model')}")
+        return None
+    return state
+
+def load_cluster_model(path: str = CLUSTER_MODEL_PATH):
+    """Retourne le MiniBatchKMeans persisté, ou None."""
+    state = load_cluster_state(path)
+    return None if state is None else state["kmeans"]
+
+def save_cluster_model(kmeans, path: str = CLUSTER_MODEL_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    joblib.dump({"kmeans": kmeans, "embedding_model": MODEL_NAME, "updated_at": time.time()}, tmp_path)
+    os.replace(tmp_path, path)
+
+def new_cluster_model():
+    return MiniBatchKMeans(n_clusters=NUM_CLUSTERS, random_state=42, batch_size=1024, n_init=3)
+
+def iter_batches(db, only_new: bool = False, batch_size: int = CLUSTER_BATCH_SIZE):
+    """
+    Lots de (ids, questions, embeddings stockés) par ordre d'id (pagination keyset, pas d'OFFSET).
+    only_new : seulement les lignes pas encore vues par partial_fit (clustered IS NULL), quel que soit leur id.
+    """
+    last_id = 0
+    while True:
+        query = select(AnswersHistory.id, AnswersHistory.question, AnswersHistory.question_embedding).where(
+            AnswersHistory.question.isnot(None), AnswersHistory.id > last_id
+        )
+        if only_new:
+            query = query.where(AnswersHistory.clustered.is_(None))
+        rows = db.execute(query.order_by(AnswersHistory.id).limit(batch_size)).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [r.id for r in rows], [r.question for r in rows], [r.question_embedding for r in rows]
+
+def batch_embeddings(model, questions, blobs) -> np.ndarray:
+    """
+    Embeddings d'un lot : ceux enregistrés dans l'historique par l'API sont relus tels quels,
+    seules les questions sans embedding (lignes antérieures) passent par le modèle, via
+    embed_queries : comme pour l'API, ces vecteurs ne remplissent pas le cache disque partagé.
+    """
+    vectors = [None] * len(questions)
+    stored = [i for i, blob in enumerate(blobs) if blob is not None]
+    missing = [i for i, blob in enumerate(blobs) if blob is None]
+    if stored:
+        for i, vector in zip(stored, unpack_embeddings([blobs[i] for i in stored])):
+            vectors[i] = vector
+    if missing:
+        for i, vector in zip(missing, model.embed_queries([questions[i] for i in missing])):
+            vectors[i] = vector
+    return np.asarray(vectors, dtype=np.float32)
+
+def write_labels(db, ids, labels):
+    """Un UPDATE groupé (executemany par clé primaire) pour tout le lot, marqué comme vu par le modèle."""
+    db.execute(update(AnswersHistory), [
+        {"id": record_id, "cluster": int(label), "clustered": True} for record_id, label in zip(ids, labels)
+    ])
+
+def process_clustering(full: bool = False, model_path: str = CLUSTER_MODEL_PATH):
+    """
+    Mode incrémental (défaut) : seules les questions pas encore vues par le modèle (clustered IS NULL,
+    et non un seuil d'id : les workers valident leurs lignes hors ordre d'id) mettent à jour
+    le modèle par partial_fit, puis reçoivent leur cluster. L'API leur en a déjà attribué un en ligne (app/ml/centroids.py) :
+    il est remplacé par celui du modèle mis à jour, que l'API recharge (CLUSTER_RELOAD_INTERVAL).
+    Mode complet (--full) : nouveau modèle appris sur tout l'historique, puis réattribution de tous les clusters.
+    """
+    print(f"--- Démarrage du clustering des questions ({'complet' if full else 'incrémental'}) ---")
+    start_time = time.time()
     db = SessionLocal()
-    
+    # Seules les lignes antérieures à l'enregistrement des embeddings passent par le modèle
+    model = get_cached_embeddings(MODEL_NAME)
+    state = None if full else load_cluster_state(model_path)
+    kmeans = None if state is None else state["kmeans"]
+    pending = None  # premier lot trop petit pour initialiser k centres
+    updated = 0
+
     try:
-        # 1. Extraction des questions (seulement celles qui n'ont pas de cluster ou qu'on veut recalculer)
-        records = db.query(AnswersHistory).filter(AnswersHistory.question.isnot(None)).all()
-        
-        if not records:
-            print("Aucune donnée à traiter.")
-            return
+        if full:
+            # 1re passe : apprentissage sur tout l'historique, lot par lot
+            kmeans = new_cluster_model()
+            fitted = False
+            for ids, questions, blobs in iter_batches(db):
+                embeddings = batch_embeddings(model, questions, blobs)
+                pending = embeddings if pending is None else np.vstack([pending, embeddings])
+                if len(pending) >= NUM_CLUSTERS:
+                    kmeans.partial_fit(pending)
+                    pending = None
+                    fitted = True
+            if not fitted:
+                print(f"Pas assez de données pour faire {NUM_CLUSTERS} clusters. (Minimum {NUM_CLUSTERS})")
+                return
+            save_cluster_model(kmeans, model_path)
 
-        questions = [r.question for r in records]
-        ids = [r.id for r in records]
-        print(f"-> {len(questions)} questions récupérées.")
+        # Attribution (2e passe en mode complet) : encodage, partial_fit, predict et UPDATE par lot
+        for ids, questions, blobs in iter_batches(db, only_new=not full):
+            embeddings = batch_embeddings(model, questions, blobs)
 
-        if len(questions) < NUM_CLUSTERS:
-            print(f"Pas assez de données pour faire {NUM_CLUSTERS} clusters. (Minimum {NUM_CLUSTERS})")
-            return
+            if not full:
+                if kmeans is None:
+                    if len(ids) < NUM_CLUSTERS:
+                        print(f"Pas assez de données pour faire {NUM_CLUSTERS} clusters. (Minimum {NUM_CLUSTERS})")
+                        return
+                    kmeans = new_cluster_model()
+                kmeans.partial_fit(embeddings)
+                # Le modèle est sauvegardé avant le commit : les labels écrits correspondent toujours à un modèle sur disque
+                save_cluster_model(kmeans, model_path)
+
+            write_labels(db, ids, kmeans.predict(embeddings))
+            db.commit()
+            updated += len(ids)
+            print(f"-> {updated} questions classées ({model.hits} embeddings depuis le cache, {model.misses} calculés, "
+                  f"les autres relus depuis l'historique)")
 
-        # 2. Génération des embeddings
-        print(f"-> Chargement du modèle {MODEL_NAME}...")
-        model = SentenceTransformer(MODEL_NAME)
-        
-        print("-> Vectorisation des questions...")
-        embeddings = model.encode(questions)
-
-        # 3. Clustering non supervisé (KMeans)
-        print(f"-> Application de KMeans (k={NUM_CLUSTERS})...")
-        kmeans = KMeans(n_clusters=NUM_CLUSTERS, random_state=42, n_init=10)
-        kmeans.fit(embeddings)
-        labels = kmeans.labels_
-
-        # 4. Stockage des clusters en base
-        print("-> Mise à jour de la base de données...")
-        for record_id, label in zip(ids, labels):
-            # Utilisation de la méthode moderne Session.get()
-            record = db.get(AnswersHistory, record_id)
-            if record:
-                record.cluster = int(label)
-        
-        db.commit()
-        print("✅ Succès : Les clusters ont été mis à jour.")
+        if updated == 0:
+            print("Aucune donnée à traiter.")
+            return
+        print(f"✅ Succès : {updated} clusters mis à jour en {time.time() - start_time:.1f}s.")
 
     except Exception as e:
         print(f"❌ Erreur critique : {e}")
@@ -68,4 +158,6 @@ def process_clustering():
         db.close()
 
 if __name__ == "__main__":
-    process_clustering()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clustering des questions de l'historique")
+    parser.add_argument("--full", action="store_true", help="Réapprendre le modèle et réattribuer tous les clusters")
+    process_clustering(full=parser.parse_args().full)
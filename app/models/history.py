@@ -1,9 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey,Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Index, LargeBinary, Boolean, text
 from datetime import datetime
 from app.database.database import Base
 
 class AnswersHistory(Base):
     __tablename__ = "rag_history"
+    # Pagination par curseur de /history : WHERE user_id = ? AND (timestamp, id) < curseur ORDER BY timestamp DESC, id DESC
+    # Lignes pas encore vues par le clustering incrémental (index partiel : ne contient que celles-là)
+    __table_args__ = (
+        Index("ix_rag_history_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_rag_history_unclustered", "id",
+              postgresql_where=text("clustered IS NULL"), sqlite_where=text("clustered IS NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -11,4 +18,15 @@ class AnswersHistory(Base):
     answer = Column(String)
     question = Column(String)
     latency_ms = Column(Float)
-    cluster = Column(Integer)
\ No newline at end of file
+    cluster = Column(Integer)
+    # Décomposition de la latence par étape (ms), NULL si la réponse vient d'un cache
+    user_lookup_ms = Column(Float, nullable=True)
+    embed_ms = Column(Float, nullable=True)
+    retrieve_ms = Column(Float, nullable=True)
+    generate_ms = Column(Float, nullable=True)
+    # Embedding de la question (float32 packés, voir pack_embedding) : le clustering et les
+    # analyses le relisent au lieu de réencoder la question
+    question_embedding = Column(LargeBinary, nullable=True)
+    # True une fois la question prise en compte par partial_fit (app/ml/clustering.py), NULL avant :
+    # les lignes validées hors ordre d'id (write-behind de plusieurs workers) ne sont jamais sautées
+    clustered = Column(Boolean, nullable=True)
@@ -1,17 +1,18 @@
 import sys
 import os
-import random
+import asyncio
 from datetime import datetime
-import time
 
 # Permet d'importer les modules de l'application
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from sqlalchemy import insert
 from app.database.database import SessionLocal
 from app.models.history import AnswersHistory
 from app.models.users import User
-# On importe la vraie fonction de RAG pour générer les réponses
-from app.rag.chain import query_rag
+# On importe la vraie fonction de RAG (version par lot) pour générer les réponses
+from app.rag.chain import query_rag_batch
+from app.rag.embedding_cache import pack_embedding
 
 questions_data = [
     # Hardware
@@ -87,40 +88,43 @@ def populate():
         user_id = user.id
         print(f"-> Utilisateur cible ID: {user_id}")
 
-        count = 0
-        for i, q in enumerate(questions_data):
-            # Vérification doublon
-            exists = db.query(AnswersHistory).filter(AnswersHistory.question == q).first()
-            if not exists:
-                print(f"[{i+1}/{len(questions_data)}] Génération pour : {q[:50]}...")
-                
-                # --- APPEL RÉEL AU RAG ---
-                try:
-                    # query_rag retourne (answer_text, elapsed_time, num_vectors)
-                    answer_text, elapsed_time, _ = query_rag(q)
-                    
-                    history_entry = AnswersHistory(
-                        user_id=user_id,
-                        question=q,
-                        answer=answer_text,
-                        latency_ms=round(elapsed_time * 1000, 2),
-                        cluster=None, # Sera calculé par le script de clustering
-                        timestamp=datetime.utcnow()
-                    )
-                    db.add(history_entry)
-                    db.commit() # On commit un par un pour voir la progression
-                    count += 1
-                    
-                    # Petite pause pour ne pas spammer l'API Google
-                    time.sleep(1) 
-                    
-                except Exception as api_err:
-                    print(f"⚠️ Erreur lors de la génération pour '{q}': {api_err}")
-                    continue
-            else:
-                print(f"[{i+1}/{len(questions_data)}] Déjà existant : {q[:30]}...")
-        
-        print(f"✅ Terminé ! {count} nouvelles réponses générées et insérées.")
+        # Vérification doublon (une seule requête pour toutes les questions)
+        existing = {
+            q for (q,) in db.query(AnswersHistory.question)
+            .filter(AnswersHistory.question.in_(questions_data))
+        }
+        pending = [q for q in questions_data if q not in existing]
+        print(f"-> {len(existing)} déjà existantes, {len(pending)} à générer.")
+        if not pending:
+            return
+
+        # --- APPEL RÉEL AU RAG (par lot) ---
+        # Concurrence et débit vers l'API Google bornés par query_rag_batch
+        outcomes = asyncio.run(query_rag_batch(pending))
+
+        rows = []
+        for q, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"⚠️ Erreur lors de la génération pour '{q}': {outcome}")
+                continue
+            # query_rag_batch retourne (answer_text, elapsed_time, num_vectors, question_vector) par question
+            answer_text, elapsed_time, _, question_vector = outcome
+            rows.append({
+                "user_id": user_id,
+                "question": q,
+                "answer": answer_text,
+                "latency_ms": round(elapsed_time * 1000, 2),
+                "cluster": None, # Sera calculé par le script de clustering
+                "question_embedding": pack_embedding(question_vector),
+                "timestamp": datetime.utcnow()
+            })
+
+        # Un seul INSERT multi-lignes + un seul commit
+        if rows:
+            db.execute(insert(AnswersHistory), rows)
+            db.commit()
+
+        print(f"✅ Terminé ! {len(rows)} nouvelles réponses générées et insérées.")
 
     except Exception as e:
         print(f"❌ Erreur globale : {e}")
@@ -129,4 +133,4 @@ def populate():
         db.close()
 
 if __name__ == "__main__":
-    populate()
\ No newline at end of file
+    populate()
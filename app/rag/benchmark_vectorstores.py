@@ -0,0 +1,100 @@
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+# Ajout du dossier parent au path pour pouvoir importer 'app'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_chroma import Chroma
+from app.rag.ingestion import DB_PATH, get_embedding_function
+from app.rag.vectorstores import ChromaBackend, HnswBackend, Int8Backend, export_embeddings
+from app.populate_db import questions_data
+
+# Benchmark rappel@k vs latence des backends vectoriels, avec Chroma comme référence.
+# Usage : python app/rag/benchmark_vectorstores.py --k 20 --queries 500 --output bench_vectors.json
+
+EF_SEARCH_VALUES = (16, 32, 64, 128, 256)
+
+
+def build_queries(db, num_queries: int, seed: int = 42):
+    """Questions réelles du support + vecteurs de chunks bruités (même distribution que le corpus)."""
+    embeddings = get_embedding_function()
+    queries = [np.asarray(v, dtype=np.float32) for v in embeddings.embed_documents(questions_data)]
+
+    _, matrix = export_embeddings(db)
+    rng = np.random.default_rng(seed)
+    extra = max(0, num_queries - len(queries))
+    if extra and len(matrix):
+        sample = matrix[rng.integers(0, len(matrix), extra)]
+        noise = rng.normal(scale=float(matrix.std()) * 0.3, size=sample.shape).astype(np.float32)
+        queries.extend(sample + noise)
+    return np.stack(queries[:num_queries]), len(matrix)
+
+
+def measure(backend, queries, k: int, truth: list = None) -> dict:
+    """Latence requête par requête (comme en production) et rappel@k par rapport à la référence."""
+    backend.search_ids(queries[:1], k)  # chargement / warmup
+    latencies, results = [], []
+    for vector in queries:
+        start_time = time.perf_counter()
+        results.append(backend.search_ids([vector], k)[0])
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    report = {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "memory_mb": round(backend.memory_bytes() / 1e6, 2),
+    }
+    if truth is not None:
+        recalls = [len(set(r) & set(t)) / max(len(t), 1) for r, t in zip(results, truth)]
+        report["recall_at_k"] = round(float(np.mean(recalls)), 4)
+    return report, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rappel@k / latence des backends vectoriels")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--output", default="bench_vectors.json")
+    args = parser.parse_args()
+
+    db = Chroma(persist_directory=DB_PATH, embedding_function=get_embedding_function())
+    queries, corpus_size = build_queries(db, args.queries)
+    print(f"Corpus : {corpus_size} vecteurs, {len(queries)} requêtes, k={args.k}")
+
+    report = {"k": args.k, "queries": len(queries), "corpus_size": corpus_size, "backends": {}}
+    chroma_report, truth = measure(ChromaBackend(db), queries, args.k)
+    chroma_report["recall_at_k"] = 1.0
+    chroma_report["memory_mb"] = round(corpus_size * queries.shape[1] * 4 / 1e6, 2)  # vecteurs float32
+    report["backends"]["chroma"] = chroma_report
+
+    with tempfile.TemporaryDirectory() as directory:
+        int8 = Int8Backend(db, directory)
+        int8.build()
+        report["backends"]["int8"] = measure(int8, queries, args.k, truth)[0]
+
+        try:
+            hnsw = HnswBackend(db, directory)
+            hnsw.build()
+            for ef_search in EF_SEARCH_VALUES:
+                hnsw.set_ef_search(ef_search)
+                report["backends"][f"hnsw_ef{ef_search}"] = measure(hnsw, queries, args.k, truth)[0]
+        except RuntimeError as e:
+            print(f"⚠️ HNSW ignoré : {e}")
+
+    print(f"\n{'backend':<14}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'mem MB':>10}")
+    for name, r in report["backends"].items():
+        print(f"{name:<14}{r['recall_at_k']:>10.4f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['memory_mb']:>10.2f}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Résultats enregistrés dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import re
+import time
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+
+# --- CONFIGURATION ---
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60  # constante de la Reciprocal Rank Fusion
+BUILD_PAGE_SIZE = 5000  # documents lus par appel à Chroma pendant la construction
+BM25_INDEX_FILE = "bm25_index.npz"  # stocké à côté de la base Chroma
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Tokens en minuscules. \\w inclut "_" : un code d'erreur comme
+    Driver_IRQL_NOT_LESS_OR_EQUAL reste un seul token, ses parties sont ajoutées aussi.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+class BM25Builder:
+    """
+    Construction en flux : les postings de chaque lot de documents sont compactés en tableaux
+    numpy (terme, document, tf : 10 octets par posting), puis fusionnés en CSR par finish().
+    Seul le vocabulaire reste un dict Python ; la mémoire suit la taille de l'index final,
+    pas celle d'un dict de listes de tuples.
+    """
+
+    def __init__(self, batch_size: int = BUILD_PAGE_SIZE):
+        self.batch_size = batch_size
+        self._term_ids = {}  # terme -> id provisoire (ordre d'apparition)
+        self._ids, self._lengths = [], []
+        self._terms, self._docs, self._tfs = [], [], []
+        self._batch = []  # (terme, doc, tf) du lot en cours
+        self._n_docs = 0
+
+    def add(self, chunk_id: str, text: str):
+        counts = Counter(tokenize(text))
+        doc = self._n_docs
+        self._n_docs += 1
+        self._ids.append(chunk_id)
+        self._lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            term_id = self._term_ids.setdefault(term, len(self._term_ids))
+            self._batch.append((term_id, doc, tf))
+        if self._n_docs % self.batch_size == 0:
+            self._flush_batch()
+
+    def _flush_batch(self):
+        if not self._batch:
+            return
+        terms, docs, tfs = zip(*self._batch)
+        self._terms.append(np.asarray(terms, dtype=np.int32))
+        self._docs.append(np.asarray(docs, dtype=np.int32))
+        self._tfs.append(np.asarray(tfs, dtype=np.uint16))
+        self._batch = []
+
+    def finish(self, k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        self._flush_batch()
+        n_docs = self._n_docs
+        lengths = np.asarray(self._lengths, dtype=np.float32)
+        avgdl = float(lengths.mean()) if n_docs else 0.0
+
+        # Vocabulaire trié : id provisoire -> rang alphabétique
+        vocab = sorted(self._term_ids)
+        rank = np.empty(len(vocab), dtype=np.int32)
+        for i, term in enumerate(vocab):
+            rank[self._term_ids[term]] = i
+
+        terms = rank[np.concatenate(self._terms)] if self._terms else np.zeros(0, dtype=np.int32)
+        docs = np.concatenate(self._docs) if self._docs else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate(self._tfs).astype(np.float32) if self._tfs else np.zeros(0, dtype=np.float32)
+        self._terms, self._docs, self._tfs = [], [], []
+
+        # Tri stable par terme : les postings d'un terme restent dans l'ordre des documents
+        order = np.argsort(terms, kind="stable")
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        df = np.bincount(terms, minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths[docs] / avgdl) if len(docs) else np.zeros(0, dtype=np.float32)
+        weights = (idf[terms] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+        return BM25Index(
+            ids=np.asarray(self._ids, dtype=str),
+            vocab=np.asarray(vocab, dtype=str),
+            offsets=offsets,
+            docs=docs.astype(np.int32),
+            weights=weights,
+        )
+
+
+class BM25Index:
+    """
+    Index inversé BM25 compact :
+    - vocab (trié) et offsets : les postings du terme i sont docs[offsets[i]:offsets[i+1]] ;
+    - weights : poids BM25 pré-calculés par posting (idf x tf normalisé), en float32.
+    Une requête ne fait donc qu'une somme pondérée (np.bincount) sur quelques postings.
+    """
+
+    def __init__(self, ids, vocab, offsets, docs, weights):
+        self.ids = ids
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        self._term_index = {term: i for i, term in enumerate(vocab.tolist())}
+
+    @classmethod
+    def build(cls, items, k1: float = BM25_K1, b: float = BM25_B):
+        """Construit l'index à partir d'un itérable de (id_chunk, texte), consommé en flux."""
+        builder = BM25Builder()
+        for chunk_id, text in items:
+            builder.add(chunk_id, text)
+        return builder.finish(k1, b)
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Retourne [(id_chunk, score)] des k meilleurs documents."""
+        rows = [self._term_index[t] for t in set(tokenize(query)) if t in self._term_index]
+        if not rows:
+            return []
+        docs = np.concatenate([self.docs[self.offsets[r]:self.offsets[r + 1]] for r in rows])
+        weights = np.concatenate([self.weights[self.offsets[r]:self.offsets[r + 1]] for r in rows])
+
+        # Agrégation sur les seuls documents candidats (pas de tableau de taille N)
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.ids[candidates[i]]), float(scores[i])) for i in top]
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, ids=self.ids, vocab=self.vocab, offsets=self.offsets, docs=self.docs, weights=self.weights)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(data["ids"], data["vocab"], data["offsets"], data["docs"], data["weights"])
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class BM25IndexLoader:
+    """Charge l'index depuis le disque et le recharge quand l'ingestion l'a réécrit."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._index = None
+
+    def get(self):
+        """Retourne l'index courant, ou None s'il n'a pas encore été construit."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._index = BM25Index.load(self.path)
+                    self._mtime = mtime
+        return self._index
+
+
+def build_from_chroma(db, path: str, page_size: int = BUILD_PAGE_SIZE) -> BM25Index:
+    """Reconstruit l'index BM25 sur tous les chunks de la collection Chroma et l'écrit sur disque."""
+    start_time = time.time()
+
+    def iter_chunks():
+        offset = 0
+        while True:
+            page = db._collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["documents"])
+            offset += len(page["ids"])
+
+    index = BM25Index.build(iter_chunks())
+    index.save(path)
+    print(f"Index BM25 : {len(index)} chunks, {len(index.vocab)} termes ({time.time() - start_time:.2f}s)")
+    return index
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> list:
+    """Fusionne des listes ordonnées d'identifiants : score = somme des 1 / (k + rang)."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
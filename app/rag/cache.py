@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# --- CONFIGURATION ---
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # similarité cosinus minimale
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # secondes
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))  # secondes
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+
+
+def normalize_question(question: str) -> str:
+    """Normalise une question pour la correspondance exacte (casse, espaces, ponctuation finale)."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class SemanticCache:
+    """
+    Cache de réponses indexé par l'embedding de la question.
+    Un hit = une question déjà vue dont la similarité cosinus dépasse le seuil.
+    Éviction LRU quand le cache est plein, expiration par TTL, et invalidation
+    complète quand le namespace (config RAG + base vectorielle) change.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._namespace = None
+        self._vectors = None  # matrice (max_entries, dim) de vecteurs normalisés
+        self._entries = OrderedDict()  # slot -> entrée, du moins au plus récemment utilisé
+        self._free_slots = list(range(max_entries))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, vector, namespace: str = None):
+        """Retourne l'entrée la plus proche si elle dépasse le seuil, sinon None."""
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            self._check_namespace(namespace)
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+            sims = self._vectors[slots] @ query
+            best = int(np.argmax(sims))
+            slot = int(slots[best])
+            entry = self._entries[slot]
+
+            if now - entry["created_at"] > self.ttl:
+                self._evict(slot)
+                self.misses += 1
+                return None
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return {**entry, "similarity": float(sims[best])}
+
+    def store(self, vector, namespace: str = None, **payload):
+        """Ajoute une réponse au cache (éviction LRU si plein)."""
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_namespace(namespace)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+            if not self._free_slots:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+                self.evictions += 1
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = query
+            self._entries[slot] = {**payload, "created_at": time.time()}
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    # --- Interne (appelé sous verrou) ---
+    def _check_namespace(self, namespace):
+        if namespace is not None and namespace != self._namespace:
+            if self._namespace is not None:
+                self.invalidations += 1
+            self._reset()
+            self._namespace = namespace
+
+    def _reset(self):
+        self._entries.clear()
+        self._free_slots = list(range(self.max_entries))
+
+    def _evict(self, slot):
+        del self._entries[slot]
+        self._free_slots.append(slot)
+
+    @staticmethod
+    def _normalize(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+
+class ResponseCache:
+    """
+    Cache exact (TTL + LRU) avec déduplication des requêtes concurrentes (single-flight) :
+    si la même clé est déjà en cours de calcul, les appelants attendent ce calcul
+    au lieu d'en lancer un nouveau.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (expire_at, valeur)
+        self._ainflight = {}  # clé -> asyncio.Future du calcul en cours (boucle d'événements)
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def aget_or_compute(self, key: str, compute):
+        """
+        Retourne (valeur, origine) avec origine parmi "hit", "coalesced" ou "miss".
+        compute est une fonction retournant une coroutine : seul l'appelant "miss" l'exécute,
+        les suivants attendent le même résultat ; une exception est propagée à tous
+        les appelants en attente et rien n'est mis en cache.
+        """
+        with self._lock:
+            value = self._get(key)
+            if value is not None:
+                self.hits += 1
+                return value, "hit"
+
+            future = self._ainflight.get(key)
+            leader = future is None
+            if leader:
+                future = asyncio.get_running_loop().create_future()
+                # Évite l'avertissement "exception never retrieved" quand personne n'attend
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._ainflight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # shield : l'annulation d'un appelant en attente n'annule pas le calcul partagé
+            return await asyncio.shield(future), "coalesced"
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            with self._lock:
+                self._put(key, value)
+            return value, "miss"
+        finally:
+            with self._lock:
+                self._ainflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._ainflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+        }
+
+    # --- Interne (appelé sous verrou) ---
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expire_at, value = entry
+        if time.time() > expire_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -1,14 +1,30 @@
 import os
 import time
+import asyncio
+import json
+import hashlib
+import threading
 import statistics
+from typing import NamedTuple
 import mlflow
 import mlflow.langchain
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.documents import Document
+from app.rag.telemetry import MlflowTelemetrySink
+from app.rag.cache import SemanticCache, ResponseCache, normalize_question
+from app.rag.limits import AsyncRateLimiter
+from app.rag.bm25 import BM25IndexLoader, BM25_INDEX_FILE, reciprocal_rank_fusion
+from app.rag.rerank import CrossEncoderReranker
+from app.rag.vectorstores import create_backend, VECTOR_BACKEND
+from app.rag.llm import create_llm, LLM_PROVIDER
+from app.rag.packing import pack_context, estimate_tokens, CONTEXT_TOKEN_BUDGET
+from app.rag.embedding_cache import get_cached_embeddings
+from app.core.resources import registry
+from app.core.timing import timed, current_timings
 
 load_dotenv()
 
@@ -16,35 +32,34 @@ api_key = os.getenv("GOOGLE_API_KEY")
 DB_PATH = "./vector_db"
 MLFLOW_URI = os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5000")
 EXPERIMENT_NAME = os.getenv("MLFLOW_EXPERIMENT_NAME", "RAG_Default")
+# Traitement par lots : appels LLM simultanés max et débit max (requêtes/s)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_RATE_LIMIT = float(os.getenv("BATCH_RATE_LIMIT", "2"))
 
 # --- CONFIGURATION MLFLOW ---
+# set_tracking_uri ne fait aucun appel réseau ; set_experiment est différé (voir registre)
 mlflow.set_tracking_uri(MLFLOW_URI)
-mlflow.set_experiment(EXPERIMENT_NAME)
 
 # --- CONFIGURATION RAG ---
 # Paramètres (pour pouvoir les logger plus tard)
 RAG_CONFIG = {
     "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
+    # LLM_PROVIDER=stub : LLM local au profil de latence réglable (tests de charge)
+    "llm_provider": LLM_PROVIDER,
     "llm_model": "gemini-2.5-flash",
     "temperature": 0.0,
-    "top_k": 3
+    "top_k": 3,
+    # Recherche hybride : fetch_k candidats côté vecteurs et côté BM25, fusionnés par RRF
+    "retrieval": "hybrid",
+    "fetch_k": 20,
+    "rrf_k": 60,
+    # Re-ranking : les fetch_k candidats sont re-scorés par un cross-encoder, top_k vont au prompt
+    "rerank": True,
+    "rerank_model": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    # Contexte : chunks adjacents fusionnés, quasi-doublons retirés, budget en tokens
+    "context_token_budget": CONTEXT_TOKEN_BUDGET
 }
 
-print("Chargement du modèle d'embedding...")
-embeddings = HuggingFaceEmbeddings(model_name=RAG_CONFIG["embedding_model"])
-
-vector_db = Chroma(
-    persist_directory=DB_PATH,
-    embedding_function=embeddings,
-)
-
-print(f"Initialisation du LLM...")
-llm = ChatGoogleGenerativeAI(
-    model=RAG_CONFIG["llm_model"],
-    temperature=RAG_CONFIG["temperature"],
-    google_api_key=api_key,
-)
-
 # Template du prompt
 system_prompt = """Tu es un assistant expert pour le support IT.
 Utilise STRICTEMENT le contexte ci-dessous pour répondre.
@@ -53,78 +68,486 @@ Si la réponse n’est pas dans le contexte, dis clairement : "Je ne sais pas".
 --- Contexte ---
 {context}
 """
+SYSTEM_PROMPT_TOKENS = estimate_tokens(system_prompt.replace("{context}", ""))
 prompt_template = ChatPromptTemplate.from_messages([
     ("system", system_prompt),
     ("human", "{question}")
 ])
 
-# Définition de la chaîne (pour l'enregistrement dans MLflow Model Registry)
-rag_chain_obj = prompt_template | llm | StrOutputParser()
+# --- RESSOURCES (chargées au premier usage) ---
+# Importer ce module ne charge plus rien : le modèle d'embedding, Chroma, le client
+# du LLM et l'expérience MLflow sont construits à la demande, une fois par processus.
+def _build_vector_db():
+    return Chroma(
+        persist_directory=DB_PATH,
+        embedding_function=get_embeddings(),
+    )
+
+def _build_llm():
+    return create_llm(
+        RAG_CONFIG["llm_provider"],
+        model=RAG_CONFIG["llm_model"],
+        temperature=RAG_CONFIG["temperature"],
+        api_key=api_key,
+    )
+
+def _build_reranker_model():
+    # Import local : sentence_transformers (et torch) ne sont chargés qu'au premier usage
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RAG_CONFIG["rerank_model"], device="cpu")
+
+def _build_rag_chain():
+    # Définition de la chaîne (pour l'enregistrement dans MLflow Model Registry)
+    return prompt_template | registry.get("llm") | StrOutputParser()
+
+# Enveloppé par le cache disque partagé avec l'ingestion et le clustering
+registry.register("embeddings", lambda: get_cached_embeddings(RAG_CONFIG["embedding_model"]))
+registry.register("vector_db", _build_vector_db)
+# Backend de recherche (VECTOR_BACKEND) : Chroma, ANN HNSW ou vecteurs int8
+registry.register("vector_index", lambda: create_backend(VECTOR_BACKEND, get_vector_db(), DB_PATH))
+registry.register("llm", _build_llm)
+registry.register("rag_chain", _build_rag_chain)
+registry.register("reranker_model", _build_reranker_model)
+registry.register("mlflow_experiment", lambda: mlflow.set_experiment(EXPERIMENT_NAME))
+
+# Ressources nécessaires pour servir /query (sonde de readiness)
+SERVING_RESOURCES = ("embeddings", "vector_db", "vector_index", "rag_chain", "reranker_model")
+# Ressources sûres à charger avant fork : les poids du modèle sont alors partagés
+# en copy-on-write entre les workers. Chroma (SQLite) et le client Gemini (gRPC)
+# ne supportent pas le fork et restent propres à chaque worker.
+PRELOAD_RESOURCES = ("embeddings", "reranker_model")
+
+# Re-ranking avec budget de latence (RERANK_BUDGET_MS)
+reranker = CrossEncoderReranker(lambda: registry.get("reranker_model"))
+
+# Index BM25 construit à l'ingestion (rechargé automatiquement s'il est reconstruit)
+bm25_index = BM25IndexLoader(os.path.join(DB_PATH, BM25_INDEX_FILE))
+
+def get_embeddings():
+    return registry.get("embeddings")
+
+def get_vector_db():
+    return registry.get("vector_db")
+
+def get_vector_index():
+    return registry.get("vector_index")
+
+def get_rag_chain():
+    return registry.get("rag_chain")
+
+# --- MLFLOW MODEL REGISTRY ---
+# La chaîne n'est enregistrée qu'une seule fois par configuration :
+# la version est identifiée par un hash de RAG_CONFIG + system_prompt.
+REGISTERED_MODEL_NAME = "IT_Support_RAG_Chain"
+CONFIG_HASH = hashlib.sha256(
+    (json.dumps(RAG_CONFIG, sort_keys=True) + system_prompt).encode("utf-8")
+).hexdigest()[:16]
+
+_registered_model_uri = None
+_registry_lock = threading.Lock()
+
+def get_registered_model_uri() -> str:
+    """
+    Retourne l'URI de la version enregistrée pour la configuration courante.
+    La chaîne n'est sérialisée et uploadée que si aucune version ne porte ce hash.
+    """
+    global _registered_model_uri
+    if _registered_model_uri is not None:
+        return _registered_model_uri
+
+    with _registry_lock:
+        if _registered_model_uri is not None:
+            return _registered_model_uri
+
+        client = mlflow.tracking.MlflowClient()
+        version = None
+        try:
+            for mv in client.search_model_versions(f"name='{REGISTERED_MODEL_NAME}'"):
+                if mv.tags.get("config_hash") == CONFIG_HASH:
+                    version = mv.version
+                    break
+        except mlflow.exceptions.MlflowException:
+            # Le modèle n'existe pas encore dans le registre
+            version = None
+
+        if version is None:
+            registry.get("mlflow_experiment")
+            with mlflow.start_run(run_name="rag_chain_registration"):
+                mlflow.log_params(RAG_CONFIG)
+                mlflow.log_param("config_hash", CONFIG_HASH)
+                model_info = mlflow.langchain.log_model(
+                    get_rag_chain(),
+                    artifact_path="rag_chain_model",
+                    registered_model_name=REGISTERED_MODEL_NAME
+                )
+            version = model_info.registered_model_version
+            client.set_model_version_tag(REGISTERED_MODEL_NAME, version, "config_hash", CONFIG_HASH)
+            print(f"Chaîne enregistrée : {REGISTERED_MODEL_NAME} v{version} (config {CONFIG_HASH})")
+
+        _registered_model_uri = f"models:/{REGISTERED_MODEL_NAME}/{version}"
+        return _registered_model_uri
+
+# --- TÉLÉMÉTRIE ---
+# Les runs MLflow sont créés par lots hors du chemin de la requête.
+# La version du registre est résolue par le worker, jamais par la requête.
+def get_telemetry_tags() -> dict:
+    """Tags des runs de requêtes. Une chaîne avec le LLM stub n'est pas enregistrée dans le registre."""
+    tags = {"config_hash": CONFIG_HASH, "llm_provider": RAG_CONFIG["llm_provider"]}
+    if RAG_CONFIG["llm_provider"] != "stub":
+        tags["model_uri"] = get_registered_model_uri()
+    return tags
+
+telemetry = MlflowTelemetrySink(
+    experiment_name=EXPERIMENT_NAME,
+    params={**RAG_CONFIG, "config_hash": CONFIG_HASH},
+    tags_provider=get_telemetry_tags,
+)
+
+# --- CACHE SÉMANTIQUE ---
+# Les questions proches d'une question déjà traitée réutilisent la réponse
+# sans recherche Chroma ni appel au LLM.
+semantic_cache = SemanticCache()
+# Cache exact + single-flight utilisé par la route /query (rafales de questions identiques)
+response_cache = ResponseCache()
+
+# Quota du LLM partagé par tous les lots du processus (les lots concurrents ne le cumulent pas)
+batch_rate_limiter = AsyncRateLimiter(BATCH_RATE_LIMIT)
+
+def get_cache_namespace() -> str:
+    """
+    Identifie l'état (configuration + base vectorielle) auquel les réponses en cache se rapportent.
+    Toute ré-ingestion modifie le fichier SQLite de Chroma et invalide donc le cache.
+    """
+    chroma_file = os.path.join(DB_PATH, "chroma.sqlite3")
+    store_version = os.path.getmtime(chroma_file) if os.path.exists(chroma_file) else 0
+    return f"{CONFIG_HASH}:{store_version}"
+
+def get_response_cache_key(question_text: str) -> str:
+    """Clé du cache exact : état de la configuration + question normalisée."""
+    return f"{get_cache_namespace()}:{normalize_question(question_text)}"
 
 def format_docs_with_score(docs_with_score):
-    """Formate les documents et extrait le score moyen."""
-    content = "\n\n".join(doc.page_content for doc, _ in docs_with_score)
-    scores = [score for _, score in docs_with_score]
+    """
+    Construit le contexte (voir packing.py) et extrait le score moyen.
+    Retourne (contexte, distance moyenne, nombre de chunks, tokens de contexte estimés).
+    """
+    content, context_tokens = pack_context([doc for doc, _ in docs_with_score])
+    # Les chunks remontés uniquement par BM25 n'ont pas de distance vectorielle
+    scores = [score for _, score in docs_with_score if score is not None]
     avg_score = statistics.mean(scores) if scores else 0
-    return content, avg_score, len(docs_with_score)
+    return content, avg_score, len(docs_with_score), context_tokens
+
+def _doc_id(doc):
+    return doc.metadata.get("id") or getattr(doc, "id", None)
+
+def get_candidate_k() -> int:
+    """Nombre de candidats à récupérer : sur-échantillonnage si fusion ou re-ranking."""
+    if RAG_CONFIG["retrieval"] == "hybrid" or RAG_CONFIG["rerank"]:
+        return max(RAG_CONFIG["fetch_k"], RAG_CONFIG["top_k"])
+    return RAG_CONFIG["top_k"]
+
+def fuse_with_keywords(question_text: str, docs_with_score: list) -> list:
+    """
+    Fusionne les résultats vectoriels avec ceux de l'index BM25 (Reciprocal Rank Fusion)
+    et retourne au plus fetch_k candidats (Document, distance ou None).
+    """
+    index = bm25_index.get() if RAG_CONFIG["retrieval"] == "hybrid" else None
+    if index is None:
+        return docs_with_score
+
+    keyword_ids = [chunk_id for chunk_id, _ in index.search(question_text, k=RAG_CONFIG["fetch_k"])]
+    vector_ids = [_doc_id(doc) for doc, _ in docs_with_score]
+    fused_ids = reciprocal_rank_fusion([vector_ids, keyword_ids], k=RAG_CONFIG["rrf_k"])[:get_candidate_k()]
+
+    by_id = {_doc_id(doc): (doc, score) for doc, score in docs_with_score}
+    missing = [chunk_id for chunk_id in fused_ids if chunk_id not in by_id]
+    if missing:
+        found = get_vector_db()._collection.get(ids=missing, include=["documents", "metadatas"])
+        for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+            by_id[chunk_id] = (Document(page_content=text, metadata=metadata or {}), None)
+    return [by_id[chunk_id] for chunk_id in fused_ids if chunk_id in by_id]
+
+def select_top_k(question_text: str, candidates: list) -> list:
+    """Re-ranking cross-encoder des candidats (sauté sous charge), puis top_k."""
+    if RAG_CONFIG["rerank"]:
+        return reranker.rerank(question_text, candidates, RAG_CONFIG["top_k"])
+    return candidates[:RAG_CONFIG["top_k"]]
+
+def retrieve_context(question_text: str, question_vector):
+    """
+    Récupération des documents AVEC score (distance) puis préparation du contexte.
+    Note: Chroma renvoie une distance (plus petit = mieux).
+    Pipeline : N candidats (vecteurs + BM25) -> re-ranking -> top_k dans le prompt.
+    """
+    docs_with_score = get_vector_index().search([question_vector], get_candidate_k())[0]
+    candidates = fuse_with_keywords(question_text, docs_with_score)
+    return format_docs_with_score(select_top_k(question_text, candidates))
+
+class RagResult(NamedTuple):
+    """
+    Résultat d'une question. L'embedding de la question est renvoyé pour être stocké
+    dans l'historique (clustering, analyses) sans repasser par le modèle.
+    """
+    answer: str
+    elapsed_time: float
+    num_chunks: int
+    question_vector: list
+
+def _answer_from_cache(question_text, question_vector, namespace, start_time, event):
+    """Retourne un RagResult si le cache sémantique répond, sinon None."""
+    cached = semantic_cache.lookup(question_vector, namespace=namespace)
+    if cached is None:
+        return None
+
+    elapsed_time = time.time() - start_time
+    event.update({
+        "answer": cached["answer"],
+        "latency_seconds": elapsed_time,
+        "num_chunks_retrieved": cached["num_chunks"],
+        "input_length": len(question_text),
+        "output_length": len(cached["answer"]),
+        "cache_hit": 1,
+    })
+    return RagResult(cached["answer"], elapsed_time, cached["num_chunks"], question_vector)
+
+# Étapes du pipeline mesurées par timed() (Server-Timing, Prometheus, télémétrie, historique)
+RAG_STAGES = ("embed", "retrieve", "generate")
+
+def _record_answer(question_text, question_vector, namespace, context, answer, start_time, event):
+    """Met la réponse en cache et complète l'événement de télémétrie."""
+    context_text, avg_distance, num_chunks, context_tokens = context
+    elapsed_time = time.time() - start_time
+    semantic_cache.store(question_vector, namespace=namespace, answer=answer, num_chunks=num_chunks)
+
+    # Événement de télémétrie (métriques + traçabilité des entrées/sorties)
+    timings = current_timings()
+    event.update({f"{stage}_seconds": timings[stage] for stage in RAG_STAGES if stage in timings})
+    event.update({
+        "answer": answer,
+        "context": context_text,
+        "latency_seconds": elapsed_time,
+        "avg_distance_score": avg_distance,  # Distance L2 (0 = identique)
+        "num_chunks_retrieved": num_chunks,
+        "context_tokens": context_tokens,
+        # Tokens envoyés au LLM (estimation : prompt système + contexte + question)
+        "prompt_tokens": SYSTEM_PROMPT_TOKENS + context_tokens + estimate_tokens(question_text),
+        "input_length": len(question_text),
+        "output_length": len(answer),
+        "cache_hit": 0,
+    })
+    return RagResult(answer, elapsed_time, num_chunks, question_vector)
 
 def query_rag(question_text: str):
     """
-    Exécute le RAG avec tracking MLflow complet.
+    Exécute le RAG. Le tracking MLflow est envoyé en arrière-plan (voir telemetry.py).
     """
     start_time = time.time()
-    
-    # Démarrage d'une "RUN" MLflow
-    with mlflow.start_run(run_name="rag_query_execution"):
-        try:
-            # 1. Log des Paramètres (Configuration)
-            mlflow.log_params(RAG_CONFIG)
-            mlflow.log_param("prompt_template", system_prompt)
-
-            # 2. Récupération des documents AVEC score (distance)
-            # Note: Chroma renvoie une distance (plus petit = mieux). 
-            # On cherche les chunks
-            docs_with_score = vector_db.similarity_search_with_score(
-                question_text, 
-                k=RAG_CONFIG["top_k"]
-            )
-            
-            # Préparation du contexte
-            context_text, avg_distance, num_chunks = format_docs_with_score(docs_with_score)
-            
-            # 3. Génération de la réponse
-            # On invoque la chaîne LLM avec le contexte récupéré
-            answer = rag_chain_obj.invoke({
-                "context": context_text,
+    event = {"question": question_text}
+
+    try:
+        # 1. Embedding de la question (une seule fois : cache + recherche)
+        with timed("embed"):
+            question_vector = get_embeddings().embed_query(question_text)
+        namespace = get_cache_namespace()
+
+        cached = _answer_from_cache(question_text, question_vector, namespace, start_time, event)
+        if cached is not None:
+            return cached
+
+        # 2. Récupération des chunks (vecteurs + mots-clés) et préparation du contexte
+        with timed("retrieve"):
+            context = retrieve_context(question_text, question_vector)
+
+        # 3. Génération de la réponse
+        # On invoque la chaîne LLM avec le contexte récupéré
+        with timed("generate"):
+            answer = get_rag_chain().invoke({
+                "context": context[0],
+                "question": question_text
+            })
+
+        return _record_answer(question_text, question_vector, namespace, context, answer, start_time, event)
+
+    except Exception as e:
+        # En cas d'erreur, on la logue aussi dans MLflow
+        event["error"] = str(e)
+        event["latency_seconds"] = time.time() - start_time
+        raise e
+
+    finally:
+        telemetry.emit(event)
+
+async def _aretrieve_context(question_text, question_vector):
+    """Recherche Chroma + BM25 (synchrones) déportée dans l'executor."""
+    return await run_in_executor(None, retrieve_context, question_text, question_vector)
+
+async def aquery_rag(question_text: str):
+    """
+    Version asynchrone de query_rag pour les routes FastAPI.
+    L'appel au LLM est nativement asynchrone ; l'embedding et la recherche Chroma
+    (bibliothèques synchrones) sont déportés dans l'executor sans bloquer la boucle.
+    """
+    start_time = time.time()
+    event = {"question": question_text}
+
+    try:
+        with timed("embed"):
+            question_vector = await get_embeddings().aembed_query(question_text)
+        namespace = get_cache_namespace()
+
+        cached = _answer_from_cache(question_text, question_vector, namespace, start_time, event)
+        if cached is not None:
+            return cached
+
+        with timed("retrieve"):
+            context = await _aretrieve_context(question_text, question_vector)
+
+        with timed("generate"):
+            answer = await get_rag_chain().ainvoke({
+                "context": context[0],
                 "question": question_text
             })
-            
-            elapsed_time = time.time() - start_time
-
-            # 4. Log des Métriques
-            mlflow.log_metric("latency_seconds", elapsed_time)
-            mlflow.log_metric("avg_distance_score", avg_distance) # Distance L2 (0 = identique)
-            mlflow.log_metric("num_chunks_retrieved", num_chunks)
-            mlflow.log_metric("input_length", len(question_text))
-            mlflow.log_metric("output_length", len(answer))
-
-            # 5. Log des Inputs / Outputs (Traçabilité)
-            mlflow.log_text(question_text, "input_question.txt")
-            mlflow.log_text(answer, "output_answer.txt")
-            mlflow.log_text(context_text, "retrieved_context.txt")
-
-            # 6. MLflow Model Registry (Enregistrement du modèle)
-            # On enregistre la chaîne utilisée pour cette requête
-            # Cela permet de versionner la logique exacte utilisée.
-            mlflow.langchain.log_model(
-                rag_chain_obj, 
-                artifact_path="rag_chain_model",
-                registered_model_name="IT_Support_RAG_Chain"
-            )
-
-            return answer, elapsed_time, num_chunks
 
+        return _record_answer(question_text, question_vector, namespace, context, answer, start_time, event)
+
+    except Exception as e:
+        event["error"] = str(e)
+        event["latency_seconds"] = time.time() - start_time
+        raise e
+
+    finally:
+        telemetry.emit(event)
+
+async def astream_rag(question_text: str):
+    """
+    Version streaming du RAG : produit des événements
+    {"type": "token", "content": ...} au fil de la génération, puis un événement
+    {"type": "end", ...} avec la réponse complète, le time-to-first-token et la latence totale.
+    """
+    start_time = time.time()
+    event = {"question": question_text}
+
+    try:
+        with timed("embed"):
+            question_vector = await get_embeddings().aembed_query(question_text)
+        namespace = get_cache_namespace()
+
+        cached = _answer_from_cache(question_text, question_vector, namespace, start_time, event)
+        if cached is not None:
+            answer, elapsed_time, num_chunks, _ = cached
+            event["ttft_seconds"] = elapsed_time
+            yield {"type": "token", "content": answer}
+            yield {"type": "end", "answer": answer, "ttft_seconds": elapsed_time,
+                   "elapsed_time": elapsed_time, "num_chunks": num_chunks, "cached": True,
+                   "question_vector": question_vector}
+            return
+
+        with timed("retrieve"):
+            context = await _aretrieve_context(question_text, question_vector)
+
+        ttft = None
+        parts = []
+        # Terminé avant l'événement "end" : generate_ms est connu quand la route écrit l'historique
+        with timed("generate"):
+            async for token in get_rag_chain().astream({
+                "context": context[0],
+                "question": question_text
+            }):
+                if ttft is None:
+                    ttft = time.time() - start_time
+                parts.append(token)
+                yield {"type": "token", "content": token}
+
+        answer = "".join(parts)
+        event["ttft_seconds"] = ttft
+        answer, elapsed_time, num_chunks, _ = _record_answer(
+            question_text, question_vector, namespace, context, answer, start_time, event
+        )
+        yield {"type": "end", "answer": answer, "ttft_seconds": ttft if ttft is not None else elapsed_time,
+               "elapsed_time": elapsed_time, "num_chunks": num_chunks, "cached": False,
+               "question_vector": question_vector}
+
+    except Exception as e:
+        event["error"] = str(e)
+        event["latency_seconds"] = time.time() - start_time
+        raise e
+
+    finally:
+        telemetry.emit(event)
+
+def _retrieve_batch(question_texts, question_vectors):
+    """Recherche vectorisée : une seule requête au backend pour tous les vecteurs du lot."""
+    results = get_vector_index().search(question_vectors, get_candidate_k())
+    contexts = []
+    for question_text, docs_with_score in zip(question_texts, results):
+        candidates = fuse_with_keywords(question_text, docs_with_score)
+        contexts.append(format_docs_with_score(select_top_k(question_text, candidates)))
+    return contexts
+
+async def query_rag_batch(questions: list, max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                          rate_limiter: AsyncRateLimiter = None):
+    """
+    Exécute le RAG sur une liste de questions.
+    Un seul appel embed_queries et une seule recherche vectorielle pour tout le lot,
+    puis les appels au LLM en parallèle (concurrence et débit bornés).
+    Retourne une liste alignée sur `questions` : un RagResult ou l'exception levée.
+    elapsed_time d'une question = préparation commune (embedding, recherche) + sa propre
+    génération, sans l'attente derrière les autres questions du lot.
+    """
+    start_time = time.time()
+    if not questions:
+        return []
+
+    namespace = get_cache_namespace()
+    question_vectors = await run_in_executor(None, get_embeddings().embed_queries, list(questions))
+
+    results = [None] * len(questions)
+    events = [{"question": q} for q in questions]
+
+    # 1. Cache sémantique
+    pending = []
+    for i, (question, vector) in enumerate(zip(questions, question_vectors)):
+        cached = _answer_from_cache(question, vector, namespace, start_time, events[i])
+        if cached is not None:
+            results[i] = cached
+            telemetry.emit(events[i])
+        else:
+            pending.append(i)
+
+    if not pending:
+        return results
+
+    # 2. Recherche vectorisée pour toutes les questions restantes
+    contexts = await run_in_executor(
+        None, _retrieve_batch, [questions[i] for i in pending], [question_vectors[i] for i in pending]
+    )
+    prepare_seconds = time.time() - start_time
+
+    # 3. Appels LLM bornés
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = rate_limiter or batch_rate_limiter
+
+    async def generate(i, context):
+        question, event = questions[i], events[i]
+        question_start = start_time
+        try:
+            async with semaphore:
+                await limiter.acquire()
+                # Horloge propre à la question : l'attente du sémaphore et du quota n'est pas comptée
+                question_start = time.time() - prepare_seconds
+                answer = await get_rag_chain().ainvoke({
+                    "context": context[0],
+                    "question": question
+                })
+            return _record_answer(question, question_vectors[i], namespace, context, answer, question_start, event)
         except Exception as e:
-            # En cas d'erreur, on la logue aussi dans MLflow
-            mlflow.log_param("error", str(e))
-            raise e
\ No newline at end of file
+            event["error"] = str(e)
+            event["latency_seconds"] = time.time() - question_start
+            return e
+        finally:
+            telemetry.emit(event)
+
+    generated = await asyncio.gather(*(generate(i, context) for i, context in zip(pending, contexts)))
+    for i, result in zip(pending, generated):
+        results[i] = result
+    return results
@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import fcntl
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+# --- CONFIGURATION ---
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+HASH_BYTES = 16  # taille d'une empreinte dans l'index (sha256 tronqué)
+# Taille maximale du cache (lignes) : au-delà, les nouveaux embeddings ne sont plus persistés
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+# Questions des utilisateurs : cache LRU en mémoire (par processus), hors du cache disque
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()[:HASH_BYTES]
+
+
+def pack_embedding(vector) -> bytes:
+    """Vecteur -> octets float32 little-endian (colonne question_embedding de l'historique)."""
+    if vector is None:
+        return None
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def unpack_embeddings(blobs) -> np.ndarray:
+    """Liste d'octets (pack_embedding) -> matrice float32 (une ligne par vecteur)."""
+    return np.vstack([np.frombuffer(blob, dtype="<f4") for blob in blobs]).astype(np.float32)
+
+
+class EmbeddingStore:
+    """
+    Cache disque des embeddings d'un modèle :
+    - vectors.f32 : matrice float32 (append-only) lue par memory-map ;
+    - hashes.bin  : empreintes des textes, la ligne i de la matrice correspond à la i-ème empreinte.
+    L'index empreinte -> ligne est reconstruit en mémoire au chargement. Les écritures sont
+    protégées par flock, le cache peut donc être partagé entre l'API, l'ingestion et le clustering.
+    Une écriture interrompue entre les deux fichiers laisse des vecteurs orphelins en fin de
+    vectors.f32 : ils sont tronqués (sous flock) avant tout nouvel ajout, l'alignement est conservé.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR, max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._hashes_path = os.path.join(self.directory, "hashes.bin")
+        self._meta_path = os.path.join(self.directory, "meta.json")
+
+        self._lock = threading.Lock()
+        self._index = {}  # empreinte -> ligne
+        self._rows = 0
+        self._hashes_offset = 0  # octets de hashes.bin déjà indexés
+        self._matrix = None
+        self.dim = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        self._refresh()
+
+    def get_many(self, hashes: list) -> dict:
+        """Retourne {empreinte: vecteur} pour les empreintes présentes dans le cache."""
+        with self._lock:
+            if any(h not in self._index for h in hashes):
+                # Un autre processus a peut-être ajouté des lignes entre-temps
+                self._refresh()
+            rows = {h: self._index[h] for h in hashes if h in self._index}
+            if not rows:
+                return {}
+            matrix = self._get_matrix()
+            return {h: np.array(matrix[row]) for h, row in rows.items()}
+
+    def put_many(self, hashes: list, vectors):
+        """Ajoute des vecteurs en fin de fichier (une seule écriture par appel)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(hashes):
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+
+            with open(self._hashes_path, "ab") as hashes_file, open(self._vectors_path, "ab") as vectors_file:
+                fcntl.flock(hashes_file, fcntl.LOCK_EX)
+                try:
+                    # Cohérence : on aligne sur le nombre de lignes réellement écrites
+                    self._refresh()
+                    new = [(h, v) for h, v in zip(hashes, vectors) if h not in self._index]
+                    new = new[:max(0, self.max_rows - self._rows)]
+                    if not new:
+                        return
+                    self._truncate_orphans()
+                    # Vecteurs d'abord : une empreinte n'est jamais visible sans son vecteur
+                    vectors_file.write(np.stack([v for _, v in new]).tobytes())
+                    vectors_file.flush()
+                    hashes_file.write(b"".join(h for h, _ in new))
+                    hashes_file.flush()
+                finally:
+                    fcntl.flock(hashes_file, fcntl.LOCK_UN)
+            self._refresh()
+
+    def __len__(self):
+        return self._rows
+
+    # --- Interne (appelé sous verrou) ---
+    def _refresh(self):
+        """Indexe les empreintes ajoutées depuis la dernière lecture (par ce processus ou un autre)."""
+        if not os.path.exists(self._hashes_path) or self.dim is None:
+            return
+        size = os.path.getsize(self._hashes_path)
+        if size <= self._hashes_offset:
+            return
+        max_rows = os.path.getsize(self._vectors_path) // (4 * self.dim)
+        with open(self._hashes_path, "rb") as f:
+            f.seek(self._hashes_offset)
+            data = f.read(size - self._hashes_offset)
+        for i in range(len(data) // HASH_BYTES):
+            row = self._rows
+            if row >= max_rows:
+                break
+            self._index[data[i * HASH_BYTES:(i + 1) * HASH_BYTES]] = row
+            self._rows += 1
+            self._hashes_offset += HASH_BYTES
+        self._matrix = None
+
+    def _truncate_orphans(self):
+        """
+        Sous flock : ramène les deux fichiers au nombre de lignes complètes (empreinte + vecteur),
+        pour que la ligne i de vectors.f32 reste celle de la i-ème empreinte.
+        """
+        row_bytes = 4 * self.dim
+        hashes_size = os.path.getsize(self._hashes_path)
+        vectors_size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = min(hashes_size // HASH_BYTES, vectors_size // row_bytes)
+        if hashes_size != rows * HASH_BYTES:
+            print(f"⚠️ Cache d'embeddings : {hashes_size - rows * HASH_BYTES} octets d'empreintes orphelines tronqués")
+            os.truncate(self._hashes_path, rows * HASH_BYTES)
+        if vectors_size != rows * row_bytes:
+            print(f"⚠️ Cache d'embeddings : {(vectors_size - rows * row_bytes) // row_bytes} vecteurs orphelins tronqués")
+            os.truncate(self._vectors_path, rows * row_bytes)
+
+    def _get_matrix(self):
+        if self._matrix is None:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return self._matrix
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un modèle d'embedding LangChain : un texte déjà vu (même modèle, même hash)
+    n'est jamais renvoyé au transformer. Les textes manquants sont calculés en un seul lot.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, store: EmbeddingStore = None,
+                 query_cache_size: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store if store is not None else EmbeddingStore(model_name)
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()  # texte -> vecteur (LRU)
+        self._queries_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_queries(self, texts: list) -> list:
+        """
+        Questions des utilisateurs : cache LRU en mémoire, indexé par le texte (ni sha256 ni
+        lecture disque). Une question répétée ne repasse pas par le transformer, sans remplir
+        le cache disque partagé ; l'historique conserve l'embedding de chaque question.
+        """
+        found = {}
+        with self._queries_lock:
+            for text in texts:
+                if text in self._queries:
+                    self._queries.move_to_end(text)
+                    found[text] = self._queries[text]
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        self.hits += len(texts) - sum(1 for t in texts if t not in found)
+        self.misses += len(missing)
+
+        if missing:
+            computed = [list(map(float, v)) for v in self.underlying.embed_documents(missing)]
+            found.update(zip(missing, computed))
+            with self._queries_lock:
+                for text, vector in zip(missing, computed):
+                    self._queries[text] = vector
+                while len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+
+        return [list(found[t]) for t in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_queries([text])[0]
+
+    def embed_documents(self, texts: list) -> list:
+        hashes = [text_hash(t) for t in texts]
+        found = self.store.get_many(hashes)
+
+        # Textes manquants, dédoublonnés dans le lot
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+        self.hits += len(texts) - sum(1 for h in hashes if h not in found)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self.underlying.embed_documents(list(missing.values()))
+            self.store.put_many(list(missing.keys()), computed)
+            found.update(zip(missing.keys(), (np.asarray(v, dtype=np.float32) for v in computed)))
+
+        return [found[h].tolist() for h in hashes]
+
+
+_shared_embeddings = {}
+_shared_lock = threading.Lock()
+
+def get_cached_embeddings(model_name: str) -> CachedEmbeddings:
+    """Instance partagée (par processus) du modèle HuggingFace enveloppé par le cache disque."""
+    with _shared_lock:
+        if model_name not in _shared_embeddings:
+            _shared_embeddings[model_name] = CachedEmbeddings(
+                HuggingFaceEmbeddings(model_name=model_name), model_name
+            )
+        return _shared_embeddings[model_name]
@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import resource
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.rag.embedding_cache import get_cached_embeddings
+from app.rag.bm25 import build_from_chroma, BM25_INDEX_FILE
+from app.rag.vectorstores import create_backend, VECTOR_BACKEND
+
+load_dotenv()
+
+# --- CONFIGURATION ---
+DATA_PATH = "./data/"
+DB_PATH = "./vector_db"
+MANIFEST_PATH = os.path.join(DB_PATH, "ingest_manifest.json")
+BM25_INDEX_PATH = os.path.join(DB_PATH, BM25_INDEX_FILE)
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# Mode streaming : nombre de lots de chunks en attente d'embedding (backpressure)
+STREAM_QUEUE_BATCHES = int(os.getenv("INGEST_STREAM_QUEUE_BATCHES", "4"))
+PROGRESS_INTERVAL = 5.0  # secondes entre deux rapports de progression
+PURGE_PAGE_SIZE = 5000  # IDs lus par page lors de la purge des sources inconnues
+
+
+def get_embedding_function():
+    # Un chunk déjà embeddé (même texte) est relu depuis le cache disque
+    return get_cached_embeddings(EMBEDDING_MODEL)
+
+def get_text_splitter():
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        add_start_index=True,
+        length_function=len
+    )
+
+def normalize_source(path: str) -> str:
+    """
+    Forme canonique d'un chemin ("./data/x.pdf" -> "data/x.pdf"), utilisée pour la métadonnée
+    "source" des chunks et les clés du manifeste : les comparaisons ne dépendent pas de l'écriture.
+    """
+    return Path(os.path.normpath(path)).as_posix()
+
+def file_fingerprint(path: str) -> str:
+    """Hash SHA-256 du contenu d'un fichier (lecture par blocs)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def page_fingerprint(source: str, page, text: str) -> str:
+    """Empreinte d'une page : une page inchangée garde les mêmes IDs de chunks."""
+    return hashlib.sha256(f"{source}:{page}:{text}".encode("utf-8")).hexdigest()[:24]
+
+def split_page(page_doc, splitter=None) -> list:
+    """
+    Découpe une page en chunks dont l'ID (empreinte de page + index) ne dépend que du contenu.
+    Retourne des dicts {id, text, metadata} (sérialisables entre processus).
+    """
+    splitter = splitter or get_text_splitter()
+    source = page_doc.metadata.get("source")
+    page = page_doc.metadata.get("page")
+    page_hash = page_fingerprint(source, page, page_doc.page_content)
+
+    chunks = []
+    for index, chunk in enumerate(splitter.split_documents([page_doc])):
+        chunk_id = f"{page_hash}:{index}"
+        chunk.metadata["id"] = chunk_id
+        chunks.append({"id": chunk_id, "text": chunk.page_content, "metadata": chunk.metadata})
+    return chunks
+
+def parse_pdf(path: str) -> list:
+    """Charge et découpe un PDF (exécuté dans un processus du pool)."""
+    splitter = get_text_splitter()
+    chunks = []
+    for page_doc in PyPDFLoader(path).load():
+        chunks.extend(split_page(page_doc, splitter))
+    return chunks
+
+def load_manifest() -> dict:
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest: dict):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def purge_unknown_sources(db: Chroma, sources: set) -> int:
+    """
+    Supprime les chunks dont la source n'est pas dans `sources` (chunks d'une ingestion
+    antérieure au manifeste, ou enregistrés sous un chemin non normalisé). Lecture paginée.
+    """
+    stale_ids = []
+    offset = 0
+    while True:
+        page = db._collection.get(include=["metadatas"], limit=PURGE_PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            break
+        stale_ids.extend(
+            chunk_id for chunk_id, metadata in zip(page["ids"], page["metadatas"])
+            if (metadata or {}).get("source") not in sources
+        )
+        offset += len(page["ids"])
+    for i in range(0, len(stale_ids), PURGE_PAGE_SIZE):
+        db._collection.delete(ids=stale_ids[i:i + PURGE_PAGE_SIZE])
+    if stale_ids:
+        print(f"{len(stale_ids)} chunk(s) sans source connue supprimé(s).")
+    return len(stale_ids)
+
+def get_existing_ids(db: Chroma, source: str) -> set:
+    """IDs actuellement stockés pour un fichier (la collection fait foi, pas le manifeste)."""
+    return set(db._collection.get(where={"source": source}, include=[])["ids"])
+
+def add_chunks(db: Chroma, chunks: list, batch_size: int = EMBED_BATCH_SIZE):
+    """Embedding + insertion par gros lots (un appel embed_documents par lot)."""
+    for i in range(0, len(chunks), batch_size):
+        batch = chunks[i:i + batch_size]
+        db.add_texts(
+            texts=[c["text"] for c in batch],
+            metadatas=[c["metadata"] for c in batch],
+            ids=[c["id"] for c in batch]
+        )
+
+def detect_changes(db: Chroma, manifest: dict, data_path: str, stats: dict):
+    """
+    Compare les empreintes des PDFs au manifeste et retire de Chroma les fichiers disparus.
+    Retourne (empreintes, fichiers nouveaux ou modifiés).
+    """
+    paths = sorted(
+        normalize_source(os.path.join(data_path, name)) for name in os.listdir(data_path)
+        if name.lower().endswith(".pdf")
+    )
+    # Premier passage (pas de manifeste) ou manifeste aux chemins non normalisés : la collection
+    # peut contenir des chunks sous d'autres chemins, qu'aucune comparaison ne retrouverait.
+    # Ils sont purgés ; les fichiers concernés, absents du manifeste, sont traités comme modifiés
+    # (leurs chunks sous le chemin normalisé sont alors comparés par ID).
+    legacy_keys = [key for key in manifest if key != normalize_source(key)]
+    if not manifest or legacy_keys:
+        for key in legacy_keys:
+            del manifest[key]
+        stats["chunks_deleted"] += purge_unknown_sources(db, set(paths))
+
+    stats["files"] = len(paths)
+    fingerprints = {}
+    changed = []
+    for path in paths:
+        fingerprints[path] = file_fingerprint(path)
+        if manifest.get(path, {}).get("sha256") == fingerprints[path]:
+            stats["unchanged"] += 1
+        else:
+            changed.append(path)
+
+    # Fichiers supprimés du dossier : on retire leurs chunks
+    for source in set(manifest) - set(paths):
+        stale_ids = get_existing_ids(db, source)
+        if stale_ids:
+            db._collection.delete(ids=list(stale_ids))
+        stats["chunks_deleted"] += len(stale_ids)
+        stats["removed"] += 1
+        del manifest[source]
+
+    print(f"{len(changed)} fichier(s) nouveau(x) ou modifié(s) sur {len(paths)}.")
+    return fingerprints, changed
+
+def refresh_search_indexes(db: Chroma, stats: dict):
+    """Reconstruit l'index BM25 (recherche hybride) et l'index ANN si la collection a changé."""
+    changed = stats["chunks_added"] or stats["chunks_deleted"]
+    if changed or not os.path.exists(BM25_INDEX_PATH):
+        build_from_chroma(db, BM25_INDEX_PATH)
+
+    backend = create_backend(VECTOR_BACKEND, db, DB_PATH)
+    if hasattr(backend, "build") and (changed or not os.path.exists(backend.ids_path)):
+        backend.build()
+
+def new_stats() -> dict:
+    return {"files": 0, "unchanged": 0, "changed": 0, "removed": 0, "chunks_added": 0, "chunks_deleted": 0}
+
+def ingest_directory(data_path: str = DATA_PATH, workers: int = INGEST_WORKERS) -> dict:
+    """
+    Ingestion incrémentale :
+    - les fichiers dont le hash n'a pas changé sont ignorés sans être relus ;
+    - les fichiers modifiés sont parsés en parallèle (pool de processus) ;
+    - seuls les chunks nouveaux sont embeddés, les IDs obsolètes sont supprimés.
+    """
+    start_time = time.time()
+    db = Chroma(persist_directory=DB_PATH, embedding_function=get_embedding_function())
+    manifest = load_manifest()
+    stats = new_stats()
+
+    # 1. Détection des changements par empreinte de fichier
+    fingerprints, changed = detect_changes(db, manifest, data_path, stats)
+
+    # 2. Parsing parallèle des fichiers modifiés
+    if changed:
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(changed)))) as executor:
+            parsed = dict(zip(changed, executor.map(parse_pdf, changed)))
+    else:
+        parsed = {}
+
+    to_add = []
+    for path, chunks in parsed.items():
+        new_ids = {c["id"] for c in chunks}
+        existing_ids = get_existing_ids(db, path)
+
+        stale_ids = existing_ids - new_ids
+        if stale_ids:
+            db._collection.delete(ids=list(stale_ids))
+        stats["chunks_deleted"] += len(stale_ids)
+
+        to_add.extend(c for c in chunks if c["id"] not in existing_ids)
+        manifest[path] = {"sha256": fingerprints[path], "chunks": len(chunks)}
+        stats["changed"] += 1
+
+    # 3. Embedding des seuls chunks nouveaux
+    if to_add:
+        print(f"Embedding de {len(to_add)} chunk(s) (lots de {EMBED_BATCH_SIZE})...")
+        add_chunks(db, to_add)
+    stats["chunks_added"] = len(to_add)
+
+    refresh_search_indexes(db, stats)
+    save_manifest(manifest)
+    stats["total_chunks"] = db._collection.count()
+    stats["elapsed_seconds"] = round(time.time() - start_time, 2)
+    print(f"Ingestion : {stats}")
+    return stats
+
+
+class IngestionProgress:
+    """Compteurs pages/chunks et rapport périodique des débits."""
+
+    def __init__(self, interval: float = PROGRESS_INTERVAL):
+        self.interval = interval
+        self.pages = 0
+        self.chunks = 0
+        self.start_time = time.time()
+        self._last_report = self.start_time
+
+    def update(self, pages: int = 0, chunks: int = 0):
+        self.pages += pages
+        self.chunks += chunks
+        now = time.time()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(f"  ... {self.report()}")
+
+    def report(self) -> str:
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        return (f"{self.pages} pages ({self.pages / elapsed:.1f} pages/s), "
+                f"{self.chunks} chunks embeddés ({self.chunks / elapsed:.1f} chunks/s)")
+
+def iter_chunk_batches(paths: list, existing_ids: dict, seen_ids: dict, progress: IngestionProgress,
+                       batch_size: int = EMBED_BATCH_SIZE):
+    """
+    Générateur page -> chunks -> lot : une seule page et un seul lot en mémoire à la fois.
+    Les chunks déjà présents dans Chroma sont ignorés ; seen_ids collecte les IDs produits par fichier.
+    """
+    splitter = get_text_splitter()
+    batch = []
+    for path in paths:
+        seen_ids[path] = set()
+        for page_doc in PyPDFLoader(path).lazy_load():
+            progress.update(pages=1)
+            for chunk in split_page(page_doc, splitter):
+                seen_ids[path].add(chunk["id"])
+                if chunk["id"] in existing_ids[path]:
+                    continue
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+def ingest_directory_streaming(data_path: str = DATA_PATH, batch_size: int = EMBED_BATCH_SIZE,
+                               max_pending_batches: int = STREAM_QUEUE_BATCHES) -> dict:
+    """
+    Ingestion incrémentale en flux, à mémoire bornée.
+    Un thread producteur lit et découpe les pages ; le thread principal embedde et écrit
+    chaque lot. La file bornée bloque le producteur quand l'embedding prend du retard,
+    donc la mémoire ne dépend pas de la taille du corpus.
+    """
+    db = Chroma(persist_directory=DB_PATH, embedding_function=get_embedding_function())
+    manifest = load_manifest()
+    stats = new_stats()
+    fingerprints, changed = detect_changes(db, manifest, data_path, stats)
+
+    existing_ids = {path: get_existing_ids(db, path) for path in changed}
+    seen_ids = {}
+    progress = IngestionProgress()
+    pending = queue.Queue(maxsize=max_pending_batches)
+    done = object()
+
+    def produce():
+        try:
+            for batch in iter_chunk_batches(changed, existing_ids, seen_ids, progress, batch_size):
+                pending.put(batch)
+            pending.put(done)
+        except Exception as e:
+            pending.put(e)
+
+    producer = threading.Thread(target=produce, name="ingestion-producer", daemon=True)
+    producer.start()
+
+    while True:
+        batch = pending.get()
+        if batch is done:
+            break
+        if isinstance(batch, Exception):
+            raise batch
+        add_chunks(db, batch, batch_size)
+        progress.update(chunks=len(batch))
+        stats["chunks_added"] += len(batch)
+    producer.join()
+
+    # Suppression des chunks obsolètes des fichiers modifiés
+    for path in changed:
+        stale_ids = existing_ids[path] - seen_ids[path]
+        if stale_ids:
+            db._collection.delete(ids=list(stale_ids))
+        stats["chunks_deleted"] += len(stale_ids)
+        manifest[path] = {"sha256": fingerprints[path], "chunks": len(seen_ids[path])}
+        stats["changed"] += 1
+
+    refresh_search_indexes(db, stats)
+    save_manifest(manifest)
+    stats["total_chunks"] = db._collection.count()
+    stats["pages"] = progress.pages
+    stats["elapsed_seconds"] = round(time.time() - progress.start_time, 2)
+    # ru_maxrss est en Ko sous Linux
+    stats["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(f"Ingestion (streaming) : {progress.report()}")
+    print(f"Ingestion : {stats}")
+    return stats
@@ -0,0 +1,24 @@
+import time
+import asyncio
+
+
+class AsyncRateLimiter:
+    """
+    Limiteur de débit asynchrone : espace les départs d'au moins 1/rate secondes.
+    Sert à ne pas dépasser le quota de l'API du LLM lors des traitements par lots.
+    """
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
@@ -0,0 +1,119 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# --- CONFIGURATION ---
+# Fournisseur du LLM : "gemini" (défaut) ou "stub" (local, pour les tests de charge)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+# Profil de latence du stub
+STUB_LLM_TTFT_MS = float(os.getenv("STUB_LLM_TTFT_MS", "300"))
+STUB_LLM_TOKENS_PER_SECOND = float(os.getenv("STUB_LLM_TOKENS_PER_SECOND", "50"))
+STUB_LLM_OUTPUT_TOKENS = int(os.getenv("STUB_LLM_OUTPUT_TOKENS", "60"))
+STUB_LLM_ERROR_RATE = float(os.getenv("STUB_LLM_ERROR_RATE", "0"))
+STUB_LLM_SEED = int(os.getenv("STUB_LLM_SEED", "0"))
+
+STUB_VOCABULARY = (
+    "redémarrez", "le", "poste", "puis", "vérifiez", "la", "connexion", "réseau",
+    "et", "contactez", "le", "support", "si", "le", "problème", "persiste",
+)
+
+
+class StubLLMError(RuntimeError):
+    """Erreur simulée par le stub (taux réglé par STUB_LLM_ERROR_RATE)."""
+
+
+class StubChatModel(BaseChatModel):
+    """
+    LLM local déterministe : la réponse ne dépend que du prompt, la latence suit un profil
+    réglable (time-to-first-token, débit en tokens/s) et une fraction des appels échoue.
+    Permet de mesurer la latence et les limites de concurrence du serveur sans Gemini.
+    """
+
+    ttft_ms: float = STUB_LLM_TTFT_MS
+    tokens_per_second: float = STUB_LLM_TOKENS_PER_SECOND
+    output_tokens: int = STUB_LLM_OUTPUT_TOKENS
+    error_rate: float = STUB_LLM_ERROR_RATE
+    seed: int = STUB_LLM_SEED
+
+    def model_post_init(self, __context):
+        # Tirage des erreurs reproductible d'une exécution à l'autre (même seed)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {
+            "ttft_ms": self.ttft_ms,
+            "tokens_per_second": self.tokens_per_second,
+            "output_tokens": self.output_tokens,
+            "error_rate": self.error_rate,
+        }
+
+    def _tokens(self, messages) -> list:
+        prompt = "\n".join(str(m.content) for m in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        tokens = [STUB_VOCABULARY[digest[i % len(digest)] % len(STUB_VOCABULARY)]
+                  for i in range(self.output_tokens)]
+        return [token if i == 0 else " " + token for i, token in enumerate(tokens)]
+
+    def _check_error(self):
+        with self._rng_lock:
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            raise StubLLMError("Erreur simulée du LLM stub")
+
+    def _delays(self, count: int):
+        """Délai avant chaque token : TTFT pour le premier, 1/débit pour les suivants."""
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return [self.ttft_ms / 1000] + [per_token] * (count - 1)
+
+    def _result(self, tokens) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._check_error()
+        tokens = self._tokens(messages)
+        time.sleep(sum(self._delays(len(tokens))))
+        return self._result(tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._check_error()
+        tokens = self._tokens(messages)
+        await asyncio.sleep(sum(self._delays(len(tokens))))
+        return self._result(tokens)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._check_error()
+        tokens = self._tokens(messages)
+        for token, delay in zip(tokens, self._delays(len(tokens))):
+            time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._check_error()
+        tokens = self._tokens(messages)
+        for token, delay in zip(tokens, self._delays(len(tokens))):
+            await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def create_llm(provider: str, model: str, temperature: float, api_key: str = None):
+    """Construit le LLM du fournisseur choisi (LLM_PROVIDER)."""
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=model, temperature=temperature, google_api_key=api_key)
+    if provider == "stub":
+        print(f"⚠️ LLM stub actif (TTFT {STUB_LLM_TTFT_MS} ms, {STUB_LLM_TOKENS_PER_SECOND} tokens/s, "
+              f"erreurs {STUB_LLM_ERROR_RATE:.0%})")
+        return StubChatModel()
+    raise ValueError(f"LLM_PROVIDER inconnu : {provider} (attendu : gemini, stub)")
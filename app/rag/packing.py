@@ -0,0 +1,103 @@
+import os
+import re
+
+# --- CONFIGURATION ---
+# Budget du contexte envoyé au LLM, en tokens (estimés)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# Similarité (Jaccard sur des 3-grammes de mots) au-delà de laquelle un passage est un quasi-doublon
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+CHARS_PER_TOKEN = 4  # approximation courante pour les tokenizers de type SentencePiece
+SHINGLE_SIZE = 3
+SEPARATOR = "\n\n"
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation du nombre de tokens (pas de tokenizer Gemini en local)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _shingles(text: str) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def merge_adjacent(docs: list) -> list:
+    """
+    Fusionne les chunks d'une même page (source:page) qui se touchent ou se chevauchent,
+    grâce au start_index posé par le splitter : le recouvrement (chunk_overlap) n'est
+    envoyé qu'une fois. Retourne des passages {text, rank} ; rank = meilleur rang des chunks fusionnés.
+    """
+    groups = {}
+    passages = []
+    for rank, doc in enumerate(docs):
+        metadata = doc.metadata or {}
+        start = metadata.get("start_index")
+        if start is None:
+            # Chunk sans position (ancienne ingestion) : gardé tel quel
+            passages.append({"text": doc.page_content, "rank": rank})
+            continue
+        key = (metadata.get("source"), metadata.get("page"))
+        groups.setdefault(key, []).append((start, rank, doc.page_content))
+
+    for chunks in groups.values():
+        chunks.sort()
+        current = None
+        for start, rank, text in chunks:
+            if current is not None and start <= current["end"]:
+                overlap = current["end"] - start
+                current["text"] += text[overlap:]
+                current["end"] = max(current["end"], start + len(text))
+                current["rank"] = min(current["rank"], rank)
+                continue
+            if current is not None:
+                passages.append(current)
+            current = {"text": text, "rank": rank, "end": start + len(text)}
+        passages.append(current)
+
+    passages.sort(key=lambda p: p["rank"])
+    return [{"text": p["text"], "rank": p["rank"]} for p in passages]
+
+
+def remove_near_duplicates(passages: list, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> list:
+    """Écarte les passages quasi identiques à un passage mieux classé (même page dans deux PDFs...)."""
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage["text"])
+        if any(_jaccard(shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def pack_context(docs: list, token_budget: int = CONTEXT_TOKEN_BUDGET):
+    """
+    Construit le contexte du prompt à partir des chunks classés par pertinence :
+    fusion des chunks adjacents, suppression des quasi-doublons, puis remplissage
+    du budget de tokens dans l'ordre de pertinence.
+    Retourne (texte, tokens estimés).
+    """
+    passages = remove_near_duplicates(merge_adjacent(docs))
+
+    parts, used = [], 0
+    separator_tokens = estimate_tokens(SEPARATOR)
+    for passage in passages:
+        cost = estimate_tokens(passage["text"]) + (separator_tokens if parts else 0)
+        if used + cost <= token_budget:
+            parts.append(passage["text"])
+            used += cost
+        elif not parts:
+            # Le passage le plus pertinent dépasse à lui seul le budget : on le tronque
+            parts.append(passage["text"][:token_budget * CHARS_PER_TOKEN])
+            used = estimate_tokens(parts[0])
+    return SEPARATOR.join(parts), used
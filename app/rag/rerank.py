@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+
+# --- CONFIGURATION ---
+# Budget de latence du re-ranking : au-delà (moyenne glissante), l'étape est sautée
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+# Nombre max de re-rankings simultanés avant de considérer le service comme chargé
+RERANK_MAX_IN_FLIGHT = int(os.getenv("RERANK_MAX_IN_FLIGHT", "4"))
+# Intervalle entre deux essais quand le budget est dépassé (pour réévaluer la latence)
+RERANK_PROBE_INTERVAL = 5.0
+EWMA_ALPHA = 0.2
+
+
+class CrossEncoderReranker:
+    """
+    Re-score (question, chunk) avec un cross-encoder CPU, en un seul forward batché,
+    et garde les k meilleurs. Sous charge (trop d'appels simultanés ou latence moyenne
+    au-dessus du budget), l'étape est sautée et l'ordre de la recherche est conservé.
+    """
+
+    def __init__(self, model_loader, budget_ms: float = RERANK_BUDGET_MS,
+                 max_in_flight: int = RERANK_MAX_IN_FLIGHT):
+        self.model_loader = model_loader
+        self.budget_ms = budget_ms
+        self.max_in_flight = max_in_flight
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._ewma_ms = None
+        self._last_run = 0.0
+
+        self.reranked = 0
+        self.skipped = 0
+
+    def rerank(self, question: str, docs_with_score: list, k: int) -> list:
+        if len(docs_with_score) <= 1 or not self._admit():
+            return docs_with_score[:k]
+
+        start_time = time.time()
+        try:
+            model = self.model_loader()
+            scores = model.predict(
+                [(question, doc.page_content) for doc, _ in docs_with_score],
+                batch_size=len(docs_with_score)
+            )
+        finally:
+            self._release((time.time() - start_time) * 1000)
+
+        order = sorted(range(len(docs_with_score)), key=lambda i: scores[i], reverse=True)
+        return [docs_with_score[i] for i in order[:k]]
+
+    def stats(self) -> dict:
+        return {
+            "reranked": self.reranked,
+            "skipped": self.skipped,
+            "in_flight": self._in_flight,
+            "avg_latency_ms": round(self._ewma_ms, 2) if self._ewma_ms is not None else None,
+            "budget_ms": self.budget_ms,
+        }
+
+    def _admit(self) -> bool:
+        with self._lock:
+            over_budget = self._ewma_ms is not None and self._ewma_ms > self.budget_ms
+            probe = time.time() - self._last_run > RERANK_PROBE_INTERVAL
+            if self._in_flight >= self.max_in_flight or (over_budget and not probe):
+                self.skipped += 1
+                return False
+            self._in_flight += 1
+            self._last_run = time.time()
+            return True
+
+    def _release(self, elapsed_ms: float):
+        with self._lock:
+            self._in_flight -= 1
+            self.reranked += 1
+            if self._ewma_ms is None:
+                self._ewma_ms = elapsed_ms
+            else:
+                self._ewma_ms = EWMA_ALPHA * elapsed_ms + (1 - EWMA_ALPHA) * self._ewma_ms
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from mlflow.tracking import MlflowClient
+from mlflow.entities import Metric, Param
+
+# --- CONFIGURATION ---
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "1000"))
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "50"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5.0"))
+# Si défini, les événements qui ne rentrent pas dans la file sont écrits ici (JSONL)
+TELEMETRY_SPILL_PATH = os.getenv("TELEMETRY_SPILL_PATH")
+
+# Limites de l'API MLflow log_batch
+MAX_METRICS_PER_CALL = 1000
+MAX_PARAMS_PER_CALL = 100
+
+# Champs numériques d'un événement loggés comme métriques (step = rang dans le batch)
+METRIC_FIELDS = (
+    "latency_seconds",
+    "ttft_seconds",
+    "embed_seconds",
+    "retrieve_seconds",
+    "generate_seconds",
+    "avg_distance_score",
+    "num_chunks_retrieved",
+    "context_tokens",
+    "prompt_tokens",
+    "input_length",
+    "output_length",
+    "cache_hit",
+)
+
+
+class MlflowTelemetrySink:
+    """
+    File bornée + worker en arrière-plan qui envoie les événements à MLflow par lots.
+    Le chemin de la requête ne fait qu'un put_nowait : la latence et la
+    disponibilité du serveur de tracking ne comptent plus pour l'utilisateur.
+    """
+
+    def __init__(self, experiment_name: str, params: dict, tags_provider=None,
+                 max_queue: int = TELEMETRY_QUEUE_SIZE,
+                 batch_size: int = TELEMETRY_BATCH_SIZE,
+                 flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+                 spill_path: str = TELEMETRY_SPILL_PATH):
+        self.experiment_name = experiment_name
+        self.params = params
+        self.tags_provider = tags_provider
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._client = None
+        self._experiment_id = None
+
+        self.stats = {"emitted": 0, "dropped": 0, "spilled": 0, "flushed": 0, "failed_batches": 0}
+
+    # --- Côté requête ---
+    def emit(self, event: dict) -> bool:
+        """Ajoute un événement sans bloquer. Retourne False s'il a été écarté ou déversé sur disque."""
+        event.setdefault("timestamp_ms", int(time.time() * 1000))
+        self.start()
+        try:
+            self._queue.put_nowait(event)
+            self.stats["emitted"] += 1
+            return True
+        except queue.Full:
+            self._spill([event])
+            return False
+
+    # --- Côté worker ---
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._spill_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="mlflow-telemetry", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout: float = 10.0):
+        """Arrête le worker après avoir vidé la file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if not batch:
+                batch = self._load_spill()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self) -> list:
+        """Attend au plus flush_interval pour remplir un lot."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, events: list):
+        try:
+            client = self._get_client()
+            tags = {"source": "query_rag", "batch_size": str(len(events))}
+            if self.tags_provider:
+                tags.update(self.tags_provider())
+
+            run = client.create_run(self._experiment_id, run_name="rag_query_batch", tags=tags)
+            run_id = run.info.run_id
+
+            params = [Param(k, str(v)) for k, v in self.params.items()]
+            metrics = [
+                Metric(field, float(event[field]), event["timestamp_ms"], step)
+                for step, event in enumerate(events)
+                for field in METRIC_FIELDS
+                if event.get(field) is not None
+            ]
+            errors = sum(1 for event in events if event.get("error"))
+            metrics.append(Metric("error_count", errors, events[-1]["timestamp_ms"], 0))
+
+            for i in range(0, max(len(params), 1), MAX_PARAMS_PER_CALL):
+                client.log_batch(run_id, params=params[i:i + MAX_PARAMS_PER_CALL])
+            for i in range(0, len(metrics), MAX_METRICS_PER_CALL):
+                client.log_batch(run_id, metrics=metrics[i:i + MAX_METRICS_PER_CALL])
+
+            # Un seul artefact par lot : questions, réponses et contextes en JSONL
+            lines = "\n".join(json.dumps(event, ensure_ascii=False) for event in events)
+            client.log_text(run_id, lines, "queries.jsonl")
+            client.set_terminated(run_id)
+            self.stats["flushed"] += len(events)
+
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            print(f"⚠️ Télémétrie MLflow indisponible ({len(events)} événements) : {e}")
+            self._spill(events)
+
+    def _get_client(self) -> MlflowClient:
+        if self._client is None:
+            client = MlflowClient()
+            experiment = client.get_experiment_by_name(self.experiment_name)
+            if experiment is None:
+                self._experiment_id = client.create_experiment(self.experiment_name)
+            else:
+                self._experiment_id = experiment.experiment_id
+            self._client = client
+        return self._client
+
+    # --- Débordement sur disque ---
+    def _spill(self, events: list):
+        if not self.spill_path:
+            self.stats["dropped"] += len(events)
+            return
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self.stats["spilled"] += len(events)
+
+    def _load_spill(self) -> list:
+        """Relit (et vide) le fichier de débordement quand la file est au repos."""
+        if not self.spill_path or self._stop.is_set():
+            return []
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return []
+            with open(self.spill_path, encoding="utf-8") as f:
+                lines = f.readlines()
+            if len(lines) > self.batch_size:
+                with open(self.spill_path, "w", encoding="utf-8") as f:
+                    f.writelines(lines[self.batch_size:])
+            else:
+                os.remove(self.spill_path)
+        return [json.loads(line) for line in lines[:self.batch_size] if line.strip()]
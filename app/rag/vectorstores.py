@@ -0,0 +1,313 @@
+import os
+import json
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+from langchain_core.documents import Document
+
+# --- CONFIGURATION ---
+# Backend de recherche vectorielle : "chroma" (défaut), "hnsw" (ANN hnswlib) ou "int8" (vecteurs quantifiés)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+ANN_INDEX_DIR = "ann_index"  # sous-dossier de la base Chroma
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))  # compromis rappel / latence à la requête
+EXPORT_PAGE_SIZE = 5000
+INT8_SEARCH_BLOCK = 65536  # lignes décompressées à la fois pendant la recherche int8
+
+
+def export_embeddings(db, page_size: int = EXPORT_PAGE_SIZE):
+    """Lit (ids, matrice float32) de toute la collection Chroma, par pages."""
+    ids, blocks = [], []
+    offset = 0
+    while True:
+        page = db._collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        ids.extend(page["ids"])
+        blocks.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    matrix = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+    return ids, matrix
+
+
+def fetch_documents(db, ids: list) -> dict:
+    """Documents (texte + métadonnées) d'une liste d'IDs, en un seul appel Chroma."""
+    if not ids:
+        return {}
+    found = db._collection.get(ids=list(set(ids)), include=["documents", "metadatas"])
+    return {
+        chunk_id: Document(page_content=text, metadata={"id": chunk_id, **(metadata or {})})
+        for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+    }
+
+
+def write_atomically(path: str, write):
+    """
+    write(chemin) écrit un fichier temporaire dans le même dossier, qui remplace ensuite path
+    d'un bloc (os.replace) : un worker qui relit l'index voit l'ancien fichier ou le nouveau, jamais un fichier partiel.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_json_atomically(path: str, data):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    write_atomically(path, write)
+
+
+class ChromaBackend:
+    """Recherche directe dans la collection Chroma (comportement historique)."""
+
+    name = "chroma"
+
+    def __init__(self, db):
+        self.db = db
+
+    def search(self, vectors, k: int) -> list:
+        """Retourne, pour chaque vecteur, [(Document, distance L2²)] triés."""
+        results = self.db._collection.query(
+            query_embeddings=[list(map(float, v)) for v in vectors],
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(page_content=doc, metadata={"id": chunk_id, **(meta or {})}), dist)
+                for chunk_id, doc, meta, dist in zip(ids, documents, metadatas, distances)
+            ]
+            for ids, documents, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"])
+        ]
+
+    def search_ids(self, vectors, k: int) -> list:
+        """IDs seuls (sans lecture des documents), pour les benchmarks."""
+        results = self.db._collection.query(
+            query_embeddings=[list(map(float, v)) for v in vectors],
+            n_results=k,
+            include=[]
+        )
+        return results["ids"]
+
+    def memory_bytes(self) -> int:
+        return 0
+
+
+class _FileBackend(ABC):
+    """
+    Base des index construits depuis Chroma et stockés sous vector_db/ann_index/.
+    Tant que l'index n'a pas été construit (ou s'il est vide), la recherche passe par Chroma.
+    """
+
+    name = None
+
+    def __init__(self, db, directory: str):
+        self.db = db
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.ids = None
+        self._fallback = ChromaBackend(db)
+        self._warned = False
+
+    @property
+    def ids_path(self):
+        return os.path.join(self.directory, f"{self.name}_ids.json")
+
+    def search(self, vectors, k: int) -> list:
+        if not self._refresh():
+            return self._fallback.search(vectors, k)
+        queries = np.asarray(vectors, dtype=np.float32)
+        rows, distances = self._search_rows(queries, min(k, len(self.ids)))
+        documents = fetch_documents(self.db, [self.ids[r] for r in rows.ravel()])
+        return [
+            [(documents[self.ids[r]], float(d)) for r, d in zip(row, dist) if self.ids[r] in documents]
+            for row, dist in zip(rows, distances)
+        ]
+
+    def search_ids(self, vectors, k: int) -> list:
+        """IDs seuls (sans lecture des documents), pour les benchmarks."""
+        if not self._refresh():
+            return self._fallback.search_ids(vectors, k)
+        rows, _ = self._search_rows(np.asarray(vectors, dtype=np.float32), min(k, len(self.ids)))
+        return [[self.ids[r] for r in row] for row in rows]
+
+    def build(self):
+        ids, matrix = export_embeddings(self.db)
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(matrix)
+        # Les IDs en dernier : leur mtime déclenche le rechargement dans les workers (_refresh)
+        write_json_atomically(self.ids_path, ids)
+        print(f"Index {self.name} : {len(ids)} vecteurs")
+
+    def _refresh(self) -> bool:
+        """
+        Charge l'index, et le recharge si l'ingestion l'a reconstruit.
+        Retourne False si aucun index utilisable n'existe (recherche via Chroma).
+        """
+        try:
+            mtime = os.path.getmtime(self.ids_path)
+            if mtime != self._mtime:
+                with self._lock:
+                    if mtime != self._mtime:
+                        with open(self.ids_path, encoding="utf-8") as f:
+                            self.ids = json.load(f)
+                        self._load()
+                        self._mtime = mtime
+        except FileNotFoundError:
+            if self._mtime is None:
+                if not self._warned:
+                    self._warned = True
+                    print(f"⚠️ Index {self.name} absent de {self.directory} (lancer l'ingestion) : recherche via Chroma")
+                return False
+            # Fichier remplacé pendant une reconstruction : on garde l'index déjà chargé
+        return bool(self.ids)
+
+    @abstractmethod
+    def _write(self, matrix):
+        """Écrit l'index construit à partir de la matrice des embeddings."""
+
+    @abstractmethod
+    def _load(self):
+        """Charge l'index écrit par _write."""
+
+    @abstractmethod
+    def _search_rows(self, queries, k):
+        """Retourne (lignes, distances L2²) des k plus proches voisins de chaque requête."""
+
+
+class HnswBackend(_FileBackend):
+    """
+    Index ANN HNSW (hnswlib, dépendance optionnelle), distance L2² comme Chroma.
+    ef_search règle le compromis rappel / latence sans reconstruire l'index.
+    """
+
+    name = "hnsw"
+
+    def __init__(self, db, directory: str, ef_search: int = HNSW_EF_SEARCH,
+                 m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION):
+        super().__init__(db, directory)
+        self.ef_search = ef_search
+        self.m = m
+        self.ef_construction = ef_construction
+        self.index = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, "hnsw.bin")
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, "hnsw_meta.json")
+
+    def set_ef_search(self, ef_search: int):
+        self.ef_search = ef_search
+        if self.index is not None:
+            self.index.set_ef(ef_search)
+
+    def memory_bytes(self) -> int:
+        return os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+
+    def _write(self, matrix):
+        hnswlib = _import_hnswlib()
+        index = hnswlib.Index(space="l2", dim=matrix.shape[1])
+        index.init_index(max_elements=len(matrix), M=self.m, ef_construction=self.ef_construction)
+        index.add_items(matrix, np.arange(len(matrix)))
+        write_atomically(self.index_path, index.save_index)
+        write_json_atomically(self.meta_path,
+                              {"dim": int(matrix.shape[1]), "m": self.m, "ef_construction": self.ef_construction})
+
+    def _load(self):
+        hnswlib = _import_hnswlib()
+        with open(self.meta_path, encoding="utf-8") as f:
+            dim = json.load(f)["dim"]
+        index = hnswlib.Index(space="l2", dim=dim)
+        index.load_index(self.index_path)
+        index.set_ef(self.ef_search)
+        self.index = index
+
+    def _search_rows(self, queries, k):
+        self.index.set_ef(max(self.ef_search, k))
+        return self.index.knn_query(queries, k=k)
+
+
+class Int8Backend(_FileBackend):
+    """
+    Vecteurs quantifiés en int8 (échelle par dimension) : 4x moins de mémoire que float32.
+    Recherche exhaustive : ||q - x||² = ||q||² - 2 q·x + ||x||², avec ||x||² pré-calculé.
+    """
+
+    name = "int8"
+
+    def __init__(self, db, directory: str):
+        super().__init__(db, directory)
+        self.codes = None
+        self.scale = None
+        self.norms = None
+
+    @property
+    def data_path(self):
+        return os.path.join(self.directory, "int8.npz")
+
+    def memory_bytes(self) -> int:
+        if self.codes is None:
+            return 0
+        return self.codes.nbytes + self.scale.nbytes + self.norms.nbytes
+
+    def _write(self, matrix):
+        scale = np.abs(matrix).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        codes = np.clip(np.round(matrix / scale), -127, 127).astype(np.int8)
+        decoded = codes.astype(np.float32) * scale
+        norms = (decoded ** 2).sum(axis=1).astype(np.float32)
+
+        def write(tmp_path):
+            # Fichier ouvert par nous : np.savez n'ajoute pas l'extension .npz au chemin temporaire
+            with open(tmp_path, "wb") as f:
+                np.savez(f, codes=codes, scale=scale.astype(np.float32), norms=norms)
+        write_atomically(self.data_path, write)
+
+    def _load(self):
+        with np.load(self.data_path) as data:
+            self.codes = data["codes"]
+            self.scale = data["scale"]
+            self.norms = data["norms"]
+
+    def _search_rows(self, queries, k):
+        # L'échelle est appliquée à la requête : on multiplie directement par les codes int8
+        scaled = queries * self.scale
+        dots = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), INT8_SEARCH_BLOCK):
+            block = self.codes[start:start + INT8_SEARCH_BLOCK].astype(np.float32)
+            dots[:, start:start + len(block)] = scaled @ block.T
+        distances = (queries ** 2).sum(axis=1, keepdims=True) - 2 * dots + self.norms
+        rows = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        row_distances = np.take_along_axis(distances, rows, axis=1)
+        order = np.argsort(row_distances, axis=1)
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(row_distances, order, axis=1)
+
+
+def _import_hnswlib():
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise RuntimeError("Le backend 'hnsw' nécessite hnswlib (pip install hnswlib)") from e
+    return hnswlib
+
+
+def create_backend(kind: str, db, db_path: str):
+    directory = os.path.join(db_path, ANN_INDEX_DIR)
+    if kind == "chroma":
+        return ChromaBackend(db)
+    if kind == "hnsw":
+        return HnswBackend(db, directory)
+    if kind == "int8":
+        return Int8Backend(db, directory)
+    raise ValueError(f"VECTOR_BACKEND inconnu : {kind} (attendu : chroma, hnsw, int8)")
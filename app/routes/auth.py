@@ -1,25 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db
 from app.models.users import User
 from app.schemas.schemas import UserCreate, UserOut, LoginRequest, LoginResponse
-from app.core.security import create_access_token, verify_password, get_password_hash
+from app.core.security import create_access_token, needs_rehash
+from app.core.passwords import password_hasher, PasswordHasherBusy
+from app.core.timing import timed
 
 router = APIRouter(tags=["Authentication"])
 
+def hasher_busy() -> HTTPException:
+    # Pic de connexions : on refuse vite plutôt que d'empiler des hachages bcrypt
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent authentications, retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
 # --- REGISTER ---
 @router.post("/register", response_model=UserOut)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # 1. Vérifier si user existe
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
+    result = await db.execute(select(User.id).where(User.username == user.username))
+    if result.scalar_one_or_none() is not None:
         raise HTTPException(
-            status_code=400, 
+            status_code=400,
             detail="Username already registered"
         )
 
-    # 2. Hasher le mot de passe (via core/security.py)
-    hashed_pw = get_password_hash(user.password)
+    # 2. Hasher le mot de passe (pool bcrypt dédié, voir core/passwords.py)
+    try:
+        with timed("password"):
+            hashed_pw = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise hasher_busy()
 
     # 3. Sauvegarder
     new_user = User(
@@ -27,28 +42,44 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_pw
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 # --- LOGIN ---
 @router.post("/login", response_model=LoginResponse)
-def login(credentials: LoginRequest, db: Session = Depends(get_db)):
+async def login(credentials: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     # 1. Chercher l'user
-    user = db.query(User).filter(User.username == credentials.username).first()
+    with timed("db"):
+        result = await db.execute(select(User).where(User.username == credentials.username))
+        user = result.scalar_one_or_none()
 
-    # 2. Vérifier user ET mot de passe (via core/security.py)
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    # 2. Vérifier user ET mot de passe (pool bcrypt dédié + cache des vérifications réussies)
+    try:
+        with timed("password"):
+            valid = user is not None and await password_hasher.verify(credentials.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise hasher_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
 
+    # Hash calculé avec un ancien BCRYPT_ROUNDS : on profite du mot de passe en clair pour le mettre à jour
+    if needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await password_hasher.hash(credentials.password)
+            await db.commit()
+        except PasswordHasherBusy:
+            pass  # sera fait à une prochaine connexion
+
     # 3. Créer le token (via core/security.py)
-    access_token = create_access_token(data={"sub": user.username})
+    # uid : les routes authentifiées n'ont pas à relire l'utilisateur en base
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id})
 
     return {
-        "access_token": access_token, 
+        "access_token": access_token,
         "token_type": "bearer"
-    }
\ No newline at end of file
+    }
@@ -1,57 +1,204 @@
-from app.core.security import verify_token
-from app.database.database import get_db
-from app.models.users import User
+import time
+import json
+import base64
+from datetime import datetime
+from typing import Optional
+from app.core.security import current_user, Principal
+from app.core.timing import timed, current_timings
+from app.database.database import get_async_db
+from app.database.history_writer import history_writer
+from app.ml.centroids import centroid_assigner
 from app.models.history import AnswersHistory
-from sqlalchemy.orm import Session
-from fastapi import Depends
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, Query
 from fastapi import APIRouter, HTTPException
-from app.rag.chain import query_rag
-from app.schemas.schemas import QueryRequest, QueryResponse , HistoryResponse, HistoryEntry
+from fastapi.responses import StreamingResponse
+from app.rag.embedding_cache import pack_embedding
+from app.rag.chain import aquery_rag, astream_rag, query_rag_batch, response_cache, get_response_cache_key
+from app.schemas.schemas import QueryRequest, QueryResponse , HistoryResponse, HistoryEntry, BatchQueryRequest, BatchQueryResponse, BatchQueryResult
 
 router = APIRouter()
 
-@router.post("/query", response_model=QueryResponse)
-def ask_rag(request: QueryRequest ,  payload: dict = Depends(verify_token),
-    db: Session = Depends(get_db)):
+# Étapes dont la durée est enregistrée dans l'historique (colonnes <étape>_ms)
+HISTORY_STAGES = ("user_lookup", "embed", "retrieve", "generate")
+
+def stage_columns() -> dict:
+    """Durées (ms) des étapes de la requête en cours, pour les colonnes de AnswersHistory."""
+    timings = current_timings()
+    return {f"{stage}_ms": round(timings[stage] * 1000, 2) if stage in timings else None for stage in HISTORY_STAGES}
 
-    username = payload.get("sub")
-    current_user = db.query(User).filter(User.username == username).first()
-    if not current_user:
-        raise HTTPException(status_code=401, detail="Utilisateur introuvable")
+@router.post("/query", response_model=QueryResponse)
+async def ask_rag(request: QueryRequest ,  user: Principal = Depends(current_user)):
     """
     Pose une question à l'assistant RAG.
     """
     try:
-        response_text, elapsed_time, num_vectors = query_rag(request.question)
+        start_time = time.time()
+        # Les requêtes identiques concurrentes partagent une seule exécution de aquery_rag
+        (response_text, elapsed_time, _, question_vector), origin = await response_cache.aget_or_compute(
+            get_response_cache_key(request.question),
+            lambda: aquery_rag(request.question)
+        )
+        if origin != "miss":
+            elapsed_time = time.time() - start_time
 
         latency = round(elapsed_time * 1000, 2)
+        # Cluster attribué en ligne (centre le plus proche du modèle de app/ml/clustering.py)
+        cluster = centroid_assigner.assign(question_vector)
         
-        # Enregistrer dans l'historique
-        history_entry = AnswersHistory(
-            user_id=current_user.id,
-            answer=response_text,
-            question=request.question,
-            latency_ms=latency,
-            cluster=num_vectors
-        )
-        db.add(history_entry)
-        db.commit()
+        # Enregistrer dans l'historique (écriture différée et groupée, voir history_writer.py)
+        with timed("persist"):
+            await history_writer.add(
+                user_id=user.id,
+                answer=response_text,
+                question=request.question,
+                latency_ms=latency,
+                cluster=cluster,  # centre le plus proche (None sans modèle), recalculé par app/ml/clustering.py
+                question_embedding=pack_embedding(question_vector),
+                **stage_columns()
+            )
     
-        return QueryResponse(answer=response_text , latency_ms=latency, cluster=num_vectors)
+        return QueryResponse(answer=response_text , latency_ms=latency, cluster=cluster)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/query/stream")
+async def ask_rag_stream(request: QueryRequest, user: Principal = Depends(current_user)):
+    """
+    Pose une question et reçoit la réponse token par token (Server-Sent Events).
+    Le dernier événement "end" donne le time-to-first-token et la latence totale.
+    """
+    user_id = user.id
+
+    async def event_stream():
+        try:
+            async for chunk in astream_rag(request.question):
+                if chunk["type"] == "token":
+                    yield sse_event("token", {"content": chunk["content"]})
+                    continue
+
+                latency = round(chunk["elapsed_time"] * 1000, 2)
+                ttft = round(chunk["ttft_seconds"] * 1000, 2)
+                cluster = centroid_assigner.assign(chunk.get("question_vector"))
+
+                # Le flux est terminé : on enregistre l'historique.
+                with timed("persist"):
+                    await history_writer.add(
+                        user_id=user_id,
+                        answer=chunk["answer"],
+                        question=request.question,
+                        latency_ms=latency,
+                        cluster=cluster,
+                        question_embedding=pack_embedding(chunk.get("question_vector")),
+                        **stage_columns()
+                    )
+
+                yield sse_event("end", {"latency_ms": latency, "ttft_ms": ttft, "cluster": cluster})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def ask_rag_batch(request: BatchQueryRequest, user: Principal = Depends(current_user)):
+    """
+    Pose plusieurs questions en un seul appel (backfills, évaluations, tri de tickets).
+    Une question en erreur n'interrompt pas le lot : son résultat porte le champ "error".
+    """
+    start_time = time.time()
+    outcomes = await query_rag_batch(request.questions)
+
+    # Tous les clusters du lot en un seul produit matriciel
+    clusters = centroid_assigner.assign_many([
+        None if isinstance(outcome, Exception) else outcome[3] for outcome in outcomes
+    ])
+
+    results = []
+    history_rows = []
+    for question, outcome, cluster in zip(request.questions, outcomes, clusters):
+        if isinstance(outcome, Exception):
+            results.append(BatchQueryResult(question=question, error=str(outcome)))
+            continue
+        response_text, elapsed_time, _, question_vector = outcome
+        latency = round(elapsed_time * 1000, 2)
+        results.append(BatchQueryResult(question=question, answer=response_text, latency_ms=latency, cluster=cluster))
+        history_rows.append({
+            "user_id": user.id,
+            "answer": response_text,
+            "question": question,
+            "latency_ms": latency,
+            "cluster": cluster,
+            "question_embedding": pack_embedding(question_vector)
+        })
+
+    # Insérées avec les autres lignes en attente, en un INSERT multi-lignes
+    if history_rows:
+        with timed("persist"):
+            await history_writer.add_many(history_rows)
+
+    return BatchQueryResponse(results=results, total_latency_ms=round((time.time() - start_time) * 1000, 2))
+
+def encode_cursor(timestamp: datetime, entry_id: int) -> str:
+    raw = json.dumps({"t": timestamp.isoformat(), "id": entry_id})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(data["t"]), int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
 @router.get("/history", response_model=HistoryResponse)
-def get_history(payload: dict = Depends(verify_token),
-    db: Session = Depends(get_db)):
+async def get_history(user: Principal = Depends(current_user),
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_answer: bool = True):
     """
-    Récupère l'historique des questions et réponses de l'utilisateur.
+    Récupère l'historique des questions et réponses de l'utilisateur, du plus récent au plus ancien.
+    Pagination par curseur (keyset sur timestamp, id) : le coût d'une page ne dépend pas
+    de la taille de l'historique. include_answer=false évite de lire le texte des réponses.
     """
-    username = payload.get("sub")
-    current_user = db.query(User).filter(User.username == username).first()
-    if not current_user:
-        raise HTTPException(status_code=401, detail="Utilisateur introuvable")
-    
-    history_entries = db.query(AnswersHistory).filter(AnswersHistory.user_id == current_user.id).all()
-    
-    return HistoryResponse(history=[HistoryEntry(question=entry.question, answer=entry.answer, timestamp=entry.timestamp, latency_ms=entry.latency_ms, cluster=entry.cluster) for entry in history_entries])
\ No newline at end of file
+    # Lecture de ses propres écritures : les réponses encore en tampon (ce worker) sont d'abord écrites
+    if history_writer.has_pending(user.id):
+        await history_writer.flush()
+
+    # Projection : seules les colonnes affichées sont lues
+    columns = [AnswersHistory.id, AnswersHistory.timestamp, AnswersHistory.question,
+               AnswersHistory.latency_ms, AnswersHistory.cluster]
+    if include_answer:
+        columns.append(AnswersHistory.answer)
+
+    query = select(*columns).where(AnswersHistory.user_id == user.id)
+    if since is not None:
+        query = query.where(AnswersHistory.timestamp >= since)
+    if until is not None:
+        query = query.where(AnswersHistory.timestamp < until)
+    if cursor is not None:
+        query = query.where(tuple_(AnswersHistory.timestamp, AnswersHistory.id) < decode_cursor(cursor))
+    # Une ligne de plus que la page : indique s'il reste des entrées
+    query = query.order_by(AnswersHistory.timestamp.desc(), AnswersHistory.id.desc()).limit(limit + 1)
+
+    with timed("db"):
+        rows = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+    return HistoryResponse(
+        history=[HistoryEntry(**row._mapping) for row in rows],
+        next_cursor=next_cursor
+    )
@@ -1,5 +1,6 @@
 from datetime import datetime
-from pydantic import BaseModel
+from typing import Optional
+from pydantic import BaseModel, Field
 
 
 class UserCreate(BaseModel):
@@ -31,18 +32,35 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     answer: str
     latency_ms: float
-    cluster: int
+    cluster: Optional[int] = None  # centre le plus proche, None tant qu'aucun modèle de clusters n'existe
+
+class BatchQueryRequest(BaseModel):
+    questions: list[str] = Field(..., min_length=1, max_length=100)
+
+class BatchQueryResult(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    latency_ms: Optional[float] = None
+    cluster: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: list[BatchQueryResult]
+    total_latency_ms: float
 
 class HistoryEntry(BaseModel):
+    id: int
     question: str
-    answer: str
+    answer: Optional[str] = None  # absent si include_answer=false
     timestamp: datetime
     latency_ms: float
-    cluster: int
+    cluster: Optional[int] = None  # NULL tant que le clustering n'est pas passé
 
     class Config:
         from_attributes = True
 class HistoryResponse(BaseModel):
     history: list[HistoryEntry]
+    # Curseur à repasser en paramètre pour la page suivante (None : dernière page)
+    next_cursor: Optional[str] = None
     class Config:
         from_attributes = True
@@ -12,4 +12,13 @@ def test_read_root():
 def test_docs_accessible():
     """Vérifie que la documentation Swagger est accessible"""
     response = client.get("/docs")
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_health_probes():
+    """Liveness is always up; readiness reports loaded resources and worker RSS"""
+    assert client.get("/health/live").status_code == 200
+    response = client.get("/health/ready")
+    assert response.status_code in [200, 503]
+    data = response.json()
+    assert "rss_mb" in data
+    assert "embeddings" in data["resources"]
@@ -0,0 +1,48 @@
+import numpy as np
+from app.rag.bm25 import BM25Index, BM25Builder, tokenize, reciprocal_rank_fusion
+
+
+def build_index():
+    return BM25Index.build([
+        ("c1", "The print queue is stuck, restart the Print Spooler service."),
+        ("c2", "A blue screen with Driver_IRQL_NOT_LESS_OR_EQUAL is caused by a faulty driver."),
+        ("c3", "If the VPN says server not found, check the gateway address."),
+    ])
+
+
+def test_tokenize_keeps_error_codes():
+    tokens = tokenize("Error Driver_IRQL_NOT_LESS_OR_EQUAL!")
+    assert "driver_irql_not_less_or_equal" in tokens
+    assert "irql" in tokens
+
+
+def test_bm25_exact_token_ranks_first():
+    results = build_index().search("I got Driver_IRQL_NOT_LESS_OR_EQUAL", k=2)
+    assert results[0][0] == "c2"
+    assert build_index().search("unknownterm") == []
+
+
+def test_bm25_roundtrip_on_disk(tmp_path):
+    path = str(tmp_path / "bm25_index.npz")
+    build_index().save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 3
+    assert loaded.search("vpn gateway", k=1)[0][0] == "c3"
+
+
+def test_streamed_build_does_not_depend_on_batch_size():
+    items = [(f"c{i}", f"vpn printer error_{i % 7} reset " * (i % 3 + 1)) for i in range(50)]
+    builder = BM25Builder(batch_size=4)
+    for chunk_id, text in items:
+        builder.add(chunk_id, text)
+    streamed, whole = builder.finish(), BM25Index.build(items)
+
+    assert streamed.vocab.tolist() == whole.vocab.tolist()
+    assert np.array_equal(streamed.offsets, whole.offsets) and np.array_equal(streamed.docs, whole.docs)
+    assert streamed.search("error_3 vpn", k=5) == whole.search("error_3 vpn", k=5)
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
@@ -0,0 +1,63 @@
+import asyncio
+import numpy as np
+from app.rag.cache import SemanticCache, ResponseCache, normalize_question
+
+
+def test_semantic_cache_hit_on_similar_vector():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    cache.store([1.0, 0.0, 0.0], namespace="v1", answer="Reset via the portal", num_chunks=3)
+
+    hit = cache.lookup([0.99, 0.05, 0.0], namespace="v1")
+    assert hit is not None
+    assert hit["answer"] == "Reset via the portal"
+    assert cache.lookup([0.0, 1.0, 0.0], namespace="v1") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_semantic_cache_lru_eviction():
+    cache = SemanticCache(threshold=0.99, ttl=60, max_entries=2)
+    cache.store([1.0, 0.0], answer="a", num_chunks=1)
+    cache.store([0.0, 1.0], answer="b", num_chunks=1)
+    # "a" devient le plus récemment utilisé, "b" est évincé
+    assert cache.lookup([1.0, 0.0]) is not None
+    cache.store([-1.0, 0.0], answer="c", num_chunks=1)
+
+    assert cache.lookup([0.0, 1.0]) is None
+    assert cache.lookup([1.0, 0.0])["answer"] == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_semantic_cache_ttl_and_namespace_invalidation():
+    cache = SemanticCache(threshold=0.9, ttl=-1, max_entries=2)  # entrées expirées dès leur création
+    cache.store(np.ones(3), namespace="v1", answer="old", num_chunks=1)
+    assert cache.lookup(np.ones(3), namespace="v1") is None
+
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=2)
+    cache.store(np.ones(3), namespace="v1", answer="old", num_chunks=1)
+    assert cache.lookup(np.ones(3), namespace="v2") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_normalize_question():
+    assert normalize_question("  How do I reset   my Password?? ") == "how do i reset my password"
+
+
+def test_response_cache_coalesces_concurrent_coroutines():
+    cache = ResponseCache(ttl=60, max_entries=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ("answer", 0.5, 3)
+
+    async def burst():
+        return await asyncio.gather(*(cache.aget_or_compute("k", compute) for _ in range(20)))
+
+    results = asyncio.run(burst())
+
+    assert len(calls) == 1
+    assert [origin for _, origin in results].count("miss") == 1
+    assert cache.stats()["coalesced"] == 19
+    assert asyncio.run(cache.aget_or_compute("k", compute))[1] == "hit"
@@ -0,0 +1,47 @@
+import os
+import asyncio
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from app.ml.centroids import CentroidAssigner
+from app.ml.clustering import save_cluster_model
+
+
+def fitted_kmeans(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    data = np.vstack([rng.normal(center, 0.1, size=(50, 8)) for center in (-2.0, 0.0, 2.0)]).astype(np.float32)
+    return MiniBatchKMeans(n_clusters=3, random_state=42, n_init=3).fit(data), data
+
+
+def test_assign_matches_kmeans_predict(tmp_path):
+    kmeans, data = fitted_kmeans()
+    path = str(tmp_path / "clusters.joblib")
+    save_cluster_model(kmeans, path=path)
+    assigner = CentroidAssigner(path)
+    assigner.load()
+
+    assert assigner.assign_many(list(data)) == kmeans.predict(data).tolist()
+    assert assigner.assign(None) is None
+
+
+def test_background_task_loads_a_model_written_later(tmp_path):
+    path = str(tmp_path / "clusters.joblib")
+    assigner = CentroidAssigner(path, reload_interval=0.01)
+    kmeans, data = fitted_kmeans()
+
+    async def scenario():
+        assigner.start()
+        await asyncio.sleep(0.05)
+        assert assigner.assign([0.0] * 8) is None  # pas encore de modèle
+
+        save_cluster_model(kmeans, path=path)
+        os.utime(path, (1, 1))  # mtime différent même sur un système de fichiers à faible résolution
+        for _ in range(100):
+            if assigner.stats()["loaded"]:
+                break
+            await asyncio.sleep(0.02)
+        await assigner.stop()
+
+    asyncio.run(scenario())
+
+    assert assigner.assign(data[0]) == int(kmeans.predict(data[:1])[0])
+    assert assigner.stats()["num_clusters"] == 3
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from sklearn.cluster import MiniBatchKMeans
+from app.database.database import Base
+from app.ml import clustering
+from app.models.history import AnswersHistory
+from app.rag.embedding_cache import pack_embedding
+
+CENTERS = np.eye(5, dtype=np.float32) * 10
+
+
+class NoEmbeddings:
+    """Every row carries its stored embedding: the model must never be called."""
+    hits = misses = 0
+
+    def embed_queries(self, texts):
+        raise AssertionError("stored embeddings should be reused")
+
+
+@pytest.fixture
+def history_db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(clustering, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(clustering, "get_cached_embeddings", lambda model_name: NoEmbeddings())
+
+    fitted_sizes = []
+    partial_fit = MiniBatchKMeans.partial_fit
+
+    def recording_partial_fit(self, X, *args, **kwargs):
+        fitted_sizes.append(len(X))
+        return partial_fit(self, X, *args, **kwargs)
+
+    monkeypatch.setattr(MiniBatchKMeans, "partial_fit", recording_partial_fit)
+    return engine, fitted_sizes
+
+
+def add_rows(engine, count, cluster=None, seed=0, first_id=None):
+    rng = np.random.default_rng(seed)
+    rows = [
+        {"user_id": 1, "question": f"q{seed}-{i}", "answer": "a", "latency_ms": 1.0, "cluster": cluster,
+         "question_embedding": pack_embedding(CENTERS[i % 5] + rng.normal(0, 0.1, 5))}
+        for i in range(count)
+    ]
+    if first_id is not None:
+        for offset, row in enumerate(rows):
+            row["id"] = first_id + offset
+    with engine.begin() as connection:
+        connection.execute(insert(AnswersHistory), rows)
+
+
+def labels(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(select(AnswersHistory.id, AnswersHistory.cluster)).all())
+
+
+def unclustered(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(AnswersHistory.id).where(AnswersHistory.clustered.is_(None))).scalars().all()
+
+
+def test_incremental_run_fits_and_labels_only_new_rows(history_db, tmp_path):
+    engine, fitted_sizes = history_db
+    model_path = str(tmp_path / "clusters.joblib")
+
+    add_rows(engine, 20)
+    clustering.process_clustering(model_path=model_path)
+    first = labels(engine)
+    assert fitted_sizes == [20]
+    assert all(label is not None for label in first.values())
+    assert unclustered(engine) == []
+
+    # Nouvelles lignes, déjà étiquetées en ligne par l'API (valeur factice ici)
+    add_rows(engine, 6, cluster=99, seed=1)
+    clustering.process_clustering(model_path=model_path)
+    second = labels(engine)
+
+    assert fitted_sizes == [20, 6]
+    assert {i: second[i] for i in first} == first
+    assert all(0 <= second[i] < clustering.NUM_CLUSTERS for i in range(21, 27))
+    assert unclustered(engine) == []
+
+
+def test_rows_committed_out_of_id_order_are_not_skipped(history_db, tmp_path):
+    engine, fitted_sizes = history_db
+    model_path = str(tmp_path / "clusters.joblib")
+
+    # Un worker valide les ids 31-40 pendant qu'un autre garde 21-26 dans son buffer
+    add_rows(engine, 20)
+    add_rows(engine, 10, cluster=99, seed=1, first_id=31)
+    clustering.process_clustering(model_path=model_path)
+    assert fitted_sizes == [30]
+
+    # Validées après le passage, avec des ids inférieurs au plus grand id déjà traité
+    add_rows(engine, 6, cluster=99, seed=2, first_id=21)
+    clustering.process_clustering(model_path=model_path)
+
+    assert fitted_sizes == [30, 6]
+    assert unclustered(engine) == []
+    assert all(0 <= labels(engine)[i] < clustering.NUM_CLUSTERS for i in range(21, 27))
+
+
+def test_rows_without_stored_embedding_are_embedded_as_queries():
+    class RecordingModel:
+        def __init__(self):
+            self.seen = []
+
+        def embed_queries(self, texts):
+            self.seen.extend(texts)
+            return [[1.0, 0.0] for _ in texts]
+
+    model = RecordingModel()
+    embeddings = clustering.batch_embeddings(model, ["old", "new"], [None, pack_embedding([0.0, 2.0])])
+
+    assert model.seen == ["old"]
+    np.testing.assert_array_equal(embeddings, [[1.0, 0.0], [0.0, 2.0]])
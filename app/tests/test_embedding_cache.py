@@ -0,0 +1,75 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.rag.embedding_cache import CachedEmbeddings, EmbeddingStore, text_hash, pack_embedding, unpack_embeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Fake model: returns [len(text), 1.0] and records every text it encodes."""
+
+    def __init__(self):
+        self.seen = []
+
+    def embed_documents(self, texts):
+        self.seen.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_cached_embeddings_never_recompute_same_text(tmp_path):
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, "fake-model", EmbeddingStore("fake-model", cache_dir=str(tmp_path)))
+
+    first = cached.embed_documents(["vpn", "printer", "vpn"])
+    second = cached.embed_documents(["printer", "wifi"])
+
+    assert first == [[3.0, 1.0], [7.0, 1.0], [3.0, 1.0]]
+    assert second == [[7.0, 1.0], [4.0, 1.0]]
+    assert model.seen == ["vpn", "printer", "wifi"]
+
+
+def test_embedding_store_is_shared_through_disk(tmp_path):
+    writer = CachedEmbeddings(CountingEmbeddings(), "fake-model", EmbeddingStore("fake-model", cache_dir=str(tmp_path)))
+    writer.embed_documents(["password reset"])
+
+    # A second process opening the same cache directory reads the vector back
+    model = CountingEmbeddings()
+    reader = CachedEmbeddings(model, "fake-model", EmbeddingStore("fake-model", cache_dir=str(tmp_path)))
+    assert reader.embed_documents(["password reset"]) == [[14.0, 1.0]]
+    assert model.seen == []
+
+
+def test_packed_embeddings_round_trip():
+    blobs = [pack_embedding([0.5, -1.0, 2.0]), pack_embedding(np.array([1.0, 0.0, 3.25]))]
+
+    assert len(blobs[0]) == 3 * 4  # float32
+    assert pack_embedding(None) is None
+    np.testing.assert_array_equal(unpack_embeddings(blobs), [[0.5, -1.0, 2.0], [1.0, 0.0, 3.25]])
+
+
+def test_orphan_vectors_do_not_shift_later_rows(tmp_path):
+    store = EmbeddingStore("fake-model", cache_dir=str(tmp_path))
+    store.put_many([text_hash("a")], [[1.0, 1.0]])
+    # Écriture interrompue : vecteurs ajoutés sans leurs empreintes
+    with open(store._vectors_path, "ab") as f:
+        f.write(np.zeros((3, 2), dtype=np.float32).tobytes())
+
+    store.put_many([text_hash("b")], [[2.0, 2.0]])
+
+    reader = EmbeddingStore("fake-model", cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(reader.get_many([text_hash("b")])[text_hash("b")], [2.0, 2.0])
+    assert len(reader) == 2
+
+
+def test_queries_are_not_persisted_and_store_is_capped(tmp_path):
+    store = EmbeddingStore("fake-model", cache_dir=str(tmp_path), max_rows=2)
+    cached = CachedEmbeddings(CountingEmbeddings(), "fake-model", store)
+
+    cached.embed_query("one-off user question")
+    cached.embed_queries(["one-off user question", "another"])
+    assert len(store) == 0
+    assert cached.underlying.seen == ["one-off user question", "another"]  # question répétée : LRU mémoire
+
+    cached.embed_documents(["a", "bb", "ccc"])
+    assert len(store) == 2
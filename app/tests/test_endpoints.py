@@ -2,10 +2,18 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch
 from app.main import app
+from app.database.migrate import migrate
 import uuid
 
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def event_loop_client():
+    # Une seule boucle d'événements pour tout le module : le pool asyncpg y reste attaché
+    migrate()
+    with client:
+        yield
+
 # Helper to generate unique users for tests
 def generate_user():
     random_str = str(uuid.uuid4())[:8]
@@ -62,11 +70,11 @@ def test_rag_query_mocked():
     token = login_res.json()["access_token"]
     headers = {"Authorization": f"Bearer {token}"}
 
-    # 2. Mock the 'query_rag' function inside app.routes.query
+    # 2. Mock the 'aquery_rag' coroutine inside app.routes.query
     # We force it to return specific values instead of calling Gemini
-    with patch("app.routes.query.query_rag") as mock_rag:
+    with patch("app.routes.query.aquery_rag") as mock_rag:
         # Define what the mock returns: (answer, time, num_vectors)
-        mock_rag.return_value = ("This is a mocked AI response.", 0.5, 3)
+        mock_rag.return_value = ("This is a mocked AI response.", 0.5, 3, [0.1, 0.2, 0.3])
 
         # 3. Call Endpoint
         response = client.post("/query", json={"question": "Test question"}, headers=headers)
@@ -77,6 +85,47 @@ def test_rag_query_mocked():
         assert data["answer"] == "This is a mocked AI response."
         assert data["cluster"] is None or isinstance(data["cluster"], int)
 
+def test_rag_query_stream_mocked():
+    """Tests the SSE /query/stream endpoint with a mocked token stream."""
+    user_data = generate_user()
+    client.post("/auth/register", json=user_data)
+    token = client.post("/auth/login", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def fake_stream(question):
+        yield {"type": "token", "content": "Streamed "}
+        yield {"type": "token", "content": "answer."}
+        yield {"type": "end", "answer": "Streamed answer.", "ttft_seconds": 0.1,
+               "elapsed_time": 0.4, "num_chunks": 3, "cached": False,
+               "question_vector": [0.1, 0.2, 0.3]}
+
+    with patch("app.routes.query.astream_rag", fake_stream):
+        response = client.post("/query/stream", json={"question": "Stream Q"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: token" in response.text
+    assert '"ttft_ms": 100.0' in response.text
+    assert '"latency_ms": 400.0' in response.text
+
+def test_rag_query_batch_mocked():
+    """Tests /query/batch: per-question results, errors don't fail the whole batch."""
+    user_data = generate_user()
+    client.post("/auth/register", json=user_data)
+    token = client.post("/auth/login", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with patch("app.routes.query.query_rag_batch") as mock_batch:
+        mock_batch.return_value = [("Batch answer", 0.2, 3, [0.1, 0.2, 0.3]), RuntimeError("quota exceeded")]
+        response = client.post("/query/batch", json={"questions": ["Batch Q1", "Batch Q2"]}, headers=headers)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["answer"] == "Batch answer"
+    assert results[0]["latency_ms"] == 200.0
+    assert results[1]["answer"] is None
+    assert results[1]["error"] == "quota exceeded"
+
 def test_get_history_authorized():
     """Test getting history after making a query"""
     # 1. Setup User & Token
@@ -86,8 +135,8 @@ def test_get_history_authorized():
     headers = {"Authorization": f"Bearer {token}"}
 
     # 2. Mock & Create a Query entry
-    with patch("app.routes.query.query_rag") as mock_rag:
-        mock_rag.return_value = ("History Answer", 0.1, 2)
+    with patch("app.routes.query.aquery_rag") as mock_rag:
+        mock_rag.return_value = ("History Answer", 0.1, 2, [0.1, 0.2, 0.3])
         client.post("/query", json={"question": "History Q"}, headers=headers)
 
     # 3. Fetch History
@@ -98,4 +147,29 @@ def test_get_history_authorized():
     # Check if our query is in the history
     assert "history" in data
     assert len(data["history"]) > 0
-    assert data["history"][0]["question"] == "History Q"
\ No newline at end of file
+    assert data["history"][0]["question"] == "History Q"
+
+def test_get_history_paginated():
+    """Keyset pagination: pages don't overlap, answers only when requested"""
+    user_data = generate_user()
+    client.post("/auth/register", json=user_data)
+    token = client.post("/auth/login", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with patch("app.routes.query.aquery_rag") as mock_rag:
+        for i in range(3):
+            mock_rag.return_value = (f"Answer {i}", 0.1, 2, None)
+            client.post("/query", json={"question": f"Paged Q{i}"}, headers=headers)
+
+    first = client.get("/history", params={"limit": 2, "include_answer": "false"}, headers=headers).json()
+    assert [e["question"] for e in first["history"]] == ["Paged Q2", "Paged Q1"]
+    assert first["history"][0]["answer"] is None
+    assert first["next_cursor"] is not None
+
+    second = client.get("/history", params={"limit": 2, "cursor": first["next_cursor"]}, headers=headers).json()
+    assert [e["question"] for e in second["history"]] == ["Paged Q0"]
+    assert second["history"][0]["answer"] == "Answer 0"
+    assert second["next_cursor"] is None
+
+    response = client.get("/history", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,127 @@
+import asyncio
+from app.database.history_writer import HistoryWriter
+
+
+class FakeSession:
+    """Records each execute() as one multi-row insert."""
+
+    def __init__(self, log, fail=False, reject=None):
+        self.log = log
+        self.fail = fail
+        self.reject = reject  # question refusée par la "base" (contrainte violée)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        if any(r["question"] == self.reject for r in rows):
+            raise ValueError("constraint violated")
+        self.log.append(list(rows))
+
+    async def commit(self):
+        pass
+
+
+def row(i, user_id=1):
+    return {"user_id": user_id, "question": f"q{i}", "answer": "a", "latency_ms": 1.0, "cluster": 1}
+
+
+def test_rows_are_buffered_then_flushed_in_one_insert():
+    inserts = []
+    writer = HistoryWriter(lambda: FakeSession(inserts), flush_interval=60, flush_size=100)
+
+    async def scenario():
+        writer.start()
+        for i in range(5):
+            await writer.add(**row(i))
+        assert inserts == []
+        assert writer.has_pending(1) and not writer.has_pending(2)
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert len(inserts) == 1
+    assert [r["question"] for r in inserts[0]] == [f"q{i}" for i in range(5)]
+    assert all("timestamp" in r for r in inserts[0])
+
+
+def test_size_threshold_triggers_a_background_flush():
+    inserts = []
+    writer = HistoryWriter(lambda: FakeSession(inserts), flush_interval=60, flush_size=3)
+
+    async def scenario():
+        writer.start()
+        for i in range(3):
+            await writer.add(**row(i))
+        await asyncio.sleep(0.05)
+        flushed = len(inserts)
+        await writer.stop()
+        return flushed
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_failed_flush_keeps_rows_for_the_next_attempt():
+    inserts = []
+    sessions = iter([FakeSession(inserts, fail=True), FakeSession(inserts)])
+    writer = HistoryWriter(lambda: next(sessions), flush_interval=60)
+
+    async def scenario():
+        writer.start()
+        await writer.add_many([row(0), row(1)])
+        await writer.flush()
+        assert writer.stats()["pending"] == 2
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert writer.failures == 1
+    assert len(inserts[0]) == 2
+
+
+def test_rejected_row_is_dropped_without_blocking_the_others():
+    inserts = []
+    writer = HistoryWriter(lambda: FakeSession(inserts, reject="q1"), flush_interval=60, max_attempts=2)
+
+    async def scenario():
+        writer.start()
+        await writer.add_many([row(0), row(1), row(2)])
+        await writer.flush()
+        assert writer.stats()["pending"] == 1  # q1 : 1er rejet, réessayée au prochain flush
+        await writer.flush()
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert sorted(r["question"] for batch in inserts for r in batch) == ["q0", "q2"]
+    assert writer.stats()["pending"] == 0
+    assert writer.dropped["rejected"] == 1
+
+
+def test_full_buffer_drops_oldest_rows_and_add_never_raises():
+    writer = HistoryWriter(lambda: FakeSession([], fail=True), flush_interval=60, max_pending=3)
+
+    async def scenario():
+        # Sans tâche de fond, add() écrit immédiatement : la base est injoignable
+        for i in range(5):
+            await writer.add(**row(i))
+
+    asyncio.run(scenario())
+
+    assert [r["question"] for r, _ in writer._rows] == ["q2", "q3", "q4"]
+    assert writer.dropped["overflow"] == 2
+
+
+def test_add_many_without_background_task_is_one_insert():
+    inserts = []
+    writer = HistoryWriter(lambda: FakeSession(inserts), flush_interval=60)
+
+    asyncio.run(writer.add_many([row(i) for i in range(4)]))
+
+    assert [len(batch) for batch in inserts] == [4]
+    assert len({r["timestamp"] for r in inserts[0]}) == 1
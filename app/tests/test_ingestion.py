@@ -0,0 +1,108 @@
+import time
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.rag import ingestion
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakePDFLoader:
+    """One page per line of the (plain text) file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def lazy_load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for page, text in enumerate(f.read().splitlines()):
+                yield Document(page_content=text, metadata={"source": self.path, "page": page})
+
+    def load(self):
+        return list(self.lazy_load())
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    monkeypatch.setattr(ingestion, "DB_PATH", str(tmp_path / "vector_db"))
+    monkeypatch.setattr(ingestion, "MANIFEST_PATH", str(tmp_path / "vector_db" / "manifest.json"))
+    monkeypatch.setattr(ingestion, "BM25_INDEX_PATH", str(tmp_path / "vector_db" / "bm25.npz"))
+    monkeypatch.setattr(ingestion, "VECTOR_BACKEND", "chroma")
+    monkeypatch.setattr(ingestion, "get_embedding_function", FakeEmbeddings)
+    monkeypatch.setattr(ingestion, "PyPDFLoader", FakePDFLoader)
+    return tmp_path
+
+
+def open_db(workspace):
+    return Chroma(persist_directory=str(workspace / "vector_db"), embedding_function=FakeEmbeddings())
+
+
+def sources(db):
+    return {m["source"] for m in db._collection.get(include=["metadatas"])["metadatas"]}
+
+
+def test_legacy_source_paths_are_purged_on_first_run(workspace):
+    (workspace / "data" / "a.pdf").write_text("reset your password\nrestart the vpn client\n")
+    # Chunks d'une ingestion antérieure, enregistrés sous un autre chemin pour le même fichier
+    open_db(workspace).add_texts(["old chunk"], metadatas=[{"source": "./data/a.pdf"}], ids=["legacy-0"])
+
+    stats = ingestion.ingest_directory_streaming("./data/")
+
+    db = open_db(workspace)
+    assert sources(db) == {"data/a.pdf"}
+    assert db._collection.count() == 2
+    assert stats["chunks_deleted"] == 1
+    assert set(ingestion.load_manifest()) == {"data/a.pdf"}
+
+
+def test_streaming_queue_stays_bounded(workspace, monkeypatch):
+    (workspace / "data" / "a.pdf").write_text("\n".join(f"page {i} about printers" for i in range(12)))
+    (workspace / "data" / "b.pdf").write_text("\n".join(f"page {i} about vpn" for i in range(12)))
+    sizes = []
+
+    class RecordingQueue(ingestion.queue.Queue):
+        def put(self, item, *args, **kwargs):
+            super().put(item, *args, **kwargs)
+            sizes.append(self.qsize())
+
+    add_chunks = ingestion.add_chunks
+
+    def slow_add_chunks(db, batch, batch_size):
+        time.sleep(0.01)  # embedding plus lent que la lecture : le producteur doit attendre
+        add_chunks(db, batch, batch_size)
+
+    monkeypatch.setattr(ingestion.queue, "Queue", RecordingQueue)
+    monkeypatch.setattr(ingestion, "add_chunks", slow_add_chunks)
+
+    stats = ingestion.ingest_directory_streaming("./data/", batch_size=2, max_pending_batches=1)
+
+    assert stats["chunks_added"] == 24 and stats["pages"] == 24
+    assert max(sizes) <= 1
+
+
+def test_streaming_updates_manifest_for_changed_and_removed_files(workspace):
+    (workspace / "data" / "a.pdf").write_text("reset your password\nrestart the vpn client\n")
+    (workspace / "data" / "b.pdf").write_text("printer is offline\n")
+    ingestion.ingest_directory_streaming("./data/")
+    assert {path: entry["chunks"] for path, entry in ingestion.load_manifest().items()} == {
+        "data/a.pdf": 2, "data/b.pdf": 1
+    }
+
+    (workspace / "data" / "a.pdf").write_text("reset your password\nclear the dns cache\n")
+    (workspace / "data" / "b.pdf").unlink()
+    stats = ingestion.ingest_directory_streaming("./data/")
+
+    manifest = ingestion.load_manifest()
+    assert set(manifest) == {"data/a.pdf"}
+    assert manifest["data/a.pdf"]["sha256"] == ingestion.file_fingerprint("data/a.pdf")
+    assert (stats["changed"], stats["removed"], stats["chunks_added"], stats["chunks_deleted"]) == (1, 1, 1, 2)
+    assert sorted(open_db(workspace)._collection.get()["documents"]) == ["clear the dns cache", "reset your password"]
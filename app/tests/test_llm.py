@@ -0,0 +1,49 @@
+import asyncio
+import time
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.rag.llm import StubChatModel, StubLLMError, create_llm
+
+prompt = ChatPromptTemplate.from_messages([("system", "Contexte : {context}"), ("human", "{question}")])
+
+
+def test_stub_is_deterministic_and_works_in_a_chain():
+    chain = prompt | StubChatModel(ttft_ms=0, tokens_per_second=0, output_tokens=8) | StrOutputParser()
+    inputs = {"context": "VPN", "question": "Le VPN ne se connecte pas"}
+
+    first = chain.invoke(inputs)
+
+    assert first == chain.invoke(inputs)
+    assert len(first.split()) == 8
+    assert first != chain.invoke({**inputs, "question": "Imprimante hors ligne"})
+
+
+def test_stub_streams_with_the_configured_latency_profile():
+    llm = StubChatModel(ttft_ms=50, tokens_per_second=100, output_tokens=5)
+
+    async def stream():
+        start_time = time.perf_counter()
+        arrivals = []
+        async for chunk in llm.astream("question"):
+            if chunk.content:
+                arrivals.append(time.perf_counter() - start_time)
+        return arrivals
+
+    arrivals = asyncio.run(stream())
+
+    assert len(arrivals) == 5
+    assert arrivals[0] >= 0.05
+    assert arrivals[-1] >= 0.05 + 4 * 0.01
+
+
+def test_stub_error_rate():
+    llm = StubChatModel(ttft_ms=0, tokens_per_second=0, output_tokens=1, error_rate=1.0)
+
+    with pytest.raises(StubLLMError):
+        llm.invoke("question")
+
+
+def test_unknown_provider():
+    with pytest.raises(ValueError):
+        create_llm("openai", model="x", temperature=0)
@@ -0,0 +1,53 @@
+from langchain_core.documents import Document
+from app.rag.packing import pack_context, merge_adjacent, estimate_tokens
+
+PAGE = "Redémarrez le routeur. " * 10 + "Vérifiez ensuite le câble réseau. " * 10
+
+
+def chunk(start, end, source="guide.pdf", page=1):
+    return Document(page_content=PAGE[start:end],
+                    metadata={"source": source, "page": page, "start_index": start})
+
+
+def test_adjacent_chunks_are_merged_without_repeating_the_overlap():
+    # Deux chunks qui se chevauchent de 50 caractères, remontés dans le désordre
+    docs = [chunk(200, 400), chunk(0, 250)]
+
+    passages = merge_adjacent(docs)
+
+    assert len(passages) == 1
+    assert passages[0]["text"] == PAGE[0:400]
+
+
+def test_chunks_from_other_pages_stay_separate():
+    docs = [chunk(0, 250), chunk(200, 400, page=2)]
+
+    assert len(merge_adjacent(docs)) == 2
+
+
+def test_near_duplicates_are_dropped():
+    text = "Pour réinitialiser le mot de passe, ouvrez le portail et suivez les étapes indiquées."
+    docs = [
+        Document(page_content=text, metadata={"source": "a.pdf", "page": 0, "start_index": 0}),
+        Document(page_content=text + " Merci.", metadata={"source": "b.pdf", "page": 3, "start_index": 0}),
+    ]
+
+    content, _ = pack_context(docs)
+
+    assert content == text
+
+
+def test_context_respects_the_token_budget_in_relevance_order():
+    docs = [
+        Document(page_content="a" * 400, metadata={"source": "a.pdf", "page": 0, "start_index": 0}),
+        Document(page_content="b" * 400, metadata={"source": "b.pdf", "page": 0, "start_index": 0}),
+        Document(page_content="c" * 40, metadata={"source": "c.pdf", "page": 0, "start_index": 0}),
+    ]
+
+    content, tokens = pack_context(docs, token_budget=120)
+
+    assert content.startswith("a" * 400)
+    assert "b" not in content
+    assert content.endswith("c" * 40)
+    assert tokens <= 120
+    assert tokens == estimate_tokens(content)
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+from app.rag.rerank import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    """Scores a (question, passage) pair by the number of shared words."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=32):
+        self.calls += 1
+        return [len(set(q.lower().split()) & set(p.lower().split())) for q, p in pairs]
+
+
+def docs(*texts):
+    return [(SimpleNamespace(page_content=t), 0.5) for t in texts]
+
+
+def test_rerank_orders_candidates_in_one_batch():
+    model = FakeCrossEncoder()
+    reranker = CrossEncoderReranker(lambda: model, budget_ms=1000)
+    candidates = docs("printer toner", "vpn client server not found", "reset password")
+
+    top = reranker.rerank("vpn server not found", candidates, k=2)
+
+    assert top[0][0].page_content == "vpn client server not found"
+    assert len(top) == 2
+    assert model.calls == 1
+
+
+def test_rerank_skipped_when_over_budget():
+    model = FakeCrossEncoder()
+    reranker = CrossEncoderReranker(lambda: model, budget_ms=-1)
+    candidates = docs("a", "b", "c")
+
+    reranker.rerank("q", candidates, k=2)  # first call measures latency
+    top = reranker.rerank("q", candidates, k=2)
+
+    assert [d.page_content for d, _ in top] == ["a", "b"]
+    assert reranker.stats()["skipped"] == 1
+    assert model.calls == 1
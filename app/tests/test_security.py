@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from app.core import security
+from app.core.security import Principal, PrincipalCache, current_user, create_access_token
+from app.core.passwords import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.fixture(autouse=True)
+def secret_key(monkeypatch):
+    monkeypatch.setattr(security, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(security, "principal_cache", PrincipalCache())
+
+
+def bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_current_user_reads_uid_without_database():
+    token = create_access_token(data={"sub": "alice", "uid": 42})
+
+    with patch("app.core.security.AsyncSessionLocal") as session:
+        principal = asyncio.run(current_user(bearer(token)))
+
+    assert principal == Principal(id=42, username="alice")
+    session.assert_not_called()
+
+
+def test_current_user_is_cached_per_token():
+    token = create_access_token(data={"sub": "alice", "uid": 42})
+    asyncio.run(current_user(bearer(token)))
+
+    with patch("app.core.security.decode_access_token") as decode:
+        assert asyncio.run(current_user(bearer(token))).id == 42
+    decode.assert_not_called()
+
+
+def test_invalid_token_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(current_user(bearer("not-a-jwt")))
+    assert error.value.status_code == 401
+
+
+def test_principal_cache_expires_with_the_token():
+    cache = PrincipalCache(ttl=300)
+    cache.put("token", Principal(id=1, username="bob"), token_exp=0)
+
+    assert cache.get("token") is None
+
+
+def test_needs_rehash_when_cost_changes(monkeypatch):
+    hashed = security.get_password_hash("pw", rounds=4)
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", 4)
+    assert not security.needs_rehash(hashed)
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", 5)
+    assert security.needs_rehash(hashed)
+
+
+def test_password_hasher_caches_successful_verifications():
+    hasher = PasswordHasher(workers=1)
+    hashed = security.get_password_hash("pw", rounds=4)
+
+    assert asyncio.run(hasher.verify("pw", hashed))
+    assert asyncio.run(hasher.verify("pw", hashed))
+    assert not asyncio.run(hasher.verify("wrong", hashed))
+    assert hasher.cache_hits == 1
+
+
+def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    hashed = security.get_password_hash("pw", rounds=4)
+
+    async def storm():
+        return await asyncio.gather(*(hasher.verify(f"pw{i}", hashed) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(storm())
+
+    assert sum(isinstance(r, PasswordHasherBusy) for r in results) == 2
+    assert hasher.rejected == 2
@@ -0,0 +1,60 @@
+import os
+import json
+import time
+from types import SimpleNamespace
+from app.rag.telemetry import MlflowTelemetrySink
+
+
+class FlakyClient:
+    """Fake MlflowClient: fails while `down` is True, records every logged query otherwise."""
+
+    def __init__(self):
+        self.down = True
+        self.runs = 0
+        self.logged = []
+
+    def create_run(self, experiment_id, run_name=None, tags=None):
+        if self.down:
+            raise ConnectionError("tracking server unreachable")
+        self.runs += 1
+        return SimpleNamespace(info=SimpleNamespace(run_id=f"run-{self.runs}"))
+
+    def log_batch(self, run_id, metrics=(), params=()):
+        pass
+
+    def log_text(self, run_id, text, artifact_file):
+        self.logged.extend(json.loads(line)["question"] for line in text.splitlines())
+
+    def set_terminated(self, run_id):
+        pass
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_failed_batches_are_spilled_then_replayed(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    client = FlakyClient()
+    sink = MlflowTelemetrySink("test", {"k": 3}, batch_size=2, flush_interval=0.05, spill_path=spill_path)
+    sink._client, sink._experiment_id = client, "0"
+
+    for i in range(3):
+        sink.emit({"question": f"q{i}", "latency_seconds": 0.1})
+
+    # Serveur indisponible : les lots échoués sont écrits sur disque, rien n'est perdu
+    assert wait_until(lambda: sink.stats["spilled"] == 3)
+    assert sink.stats["failed_batches"] >= 2 and sink.stats["dropped"] == 0
+
+    # Retour du serveur : le worker au repos rejoue le fichier de débordement
+    client.down = False
+    assert wait_until(lambda: sink.stats["flushed"] >= 3 and not os.path.exists(spill_path))
+    sink.close()
+
+    assert sorted(set(client.logged)) == ["q0", "q1", "q2"]
+    assert client.runs >= 2  # envoi par lots de batch_size
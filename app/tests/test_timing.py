@@ -0,0 +1,55 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.timing import ServerTimingMiddleware, timed, record_stage, server_timing_header
+from app.core.metrics import render_metrics
+from app.benchmark_api import parse_server_timing
+
+app = FastAPI()
+app.add_middleware(ServerTimingMiddleware)
+
+
+@app.get("/async")
+async def async_route():
+    with timed("embed"):
+        pass
+    record_stage("generate", 0.25)
+    return {"ok": True}
+
+
+@app.get("/sync")
+def sync_route():
+    record_stage("db", 0.01)
+    return {"ok": True}
+
+
+def test_server_timing_header_lists_stages_and_total():
+    client = TestClient(app)
+
+    stages = parse_server_timing(client.get("/async").headers["server-timing"])
+
+    assert set(stages) == {"embed", "generate", "total"}
+    assert stages["generate"] == 250.0
+
+
+def test_stages_recorded_in_threadpool_routes():
+    client = TestClient(app)
+
+    stages = parse_server_timing(client.get("/sync").headers["server-timing"])
+
+    assert stages["db"] == 10.0
+
+
+def test_record_stage_outside_a_request_is_ignored():
+    record_stage("embed", 1.0)
+    assert server_timing_header({}, 0.5) == "total;dur=500.00"
+
+
+def test_stages_are_exported_as_prometheus_histograms():
+    client = TestClient(app)
+    client.get("/async")
+
+    content, _ = render_metrics()
+    text = content.decode()
+
+    assert 'rag_stage_duration_seconds_bucket{le="0.25",stage="generate"}' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/async",status="200"}' in text
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from langchain_chroma import Chroma
+from app.rag.vectorstores import create_backend
+
+
+def make_db(tmp_path, n=200, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    db = Chroma(persist_directory=str(tmp_path / "vector_db"), embedding_function=None)
+    ids = [f"chunk-{i}" for i in range(n)]
+    db._collection.add(ids=ids, embeddings=vectors.tolist(), documents=[f"text {i}" for i in range(n)],
+                       metadatas=[{"source": "data/a.pdf"}] * n)
+    return db, ids, vectors
+
+
+@pytest.mark.parametrize("kind", ["hnsw", "int8"])
+def test_file_backend_build_load_search(tmp_path, kind):
+    if kind == "hnsw":
+        pytest.importorskip("hnswlib")
+    db, ids, vectors = make_db(tmp_path)
+    create_backend(kind, db, str(tmp_path / "vector_db")).build()
+    index_dir = tmp_path / "vector_db" / "ann_index"
+    assert not [p.name for p in index_dir.iterdir() if p.name.endswith(".tmp")]
+
+    # Nouvelle instance : l'index est relu depuis le disque
+    backend = create_backend(kind, db, str(tmp_path / "vector_db"))
+    results = backend.search(vectors[:3], k=5)
+
+    assert [hits[0][0].metadata["id"] for hits in results] == ids[:3]
+    assert results[0][0][0].page_content == "text 0"
+    assert backend.search_ids(vectors[7:8], k=1) == [[ids[7]]]
+
+
+def test_missing_index_falls_back_to_chroma(tmp_path):
+    db, ids, vectors = make_db(tmp_path)
+    backend = create_backend("int8", db, str(tmp_path / "vector_db"))
+
+    results = backend.search(vectors[:1], k=3)
+
+    assert results[0][0][0].metadata["id"] == ids[0]
+    assert backend.search_ids(vectors[:1], k=1) == [[ids[0]]]
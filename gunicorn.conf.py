@@ -0,0 +1,37 @@
+# Lancement en production : gunicorn -c gunicorn.conf.py app.main:app
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+
+# L'application est importée une fois dans le processus maître avant le fork :
+# avec RAG_PRELOAD=1 les poids du modèle d'embedding y sont chargés et partagés
+# en copy-on-write entre les workers (RSS par worker mesurée sur /health/ready).
+preload_app = True
+os.environ.setdefault("RAG_PRELOAD", "1")
+
+# Migration du schéma une seule fois, dans le maître avant le fork des workers
+# (DB_MIGRATE_ON_START=0 si elle est lancée à part : python app/database/migrate.py)
+DB_MIGRATE_ON_START = os.getenv("DB_MIGRATE_ON_START", "1") == "1"
+
+
+def on_starting(server):
+    if DB_MIGRATE_ON_START:
+        from app.database.migrate import migrate
+        migrate()
+
+
+# Métriques Prometheus multi-workers (PROMETHEUS_MULTIPROC_DIR, dossier vide au démarrage) :
+# vidé ici, à la lecture de la configuration, avant l'import de l'application par le maître
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)